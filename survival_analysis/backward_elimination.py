@@ -1,32 +1,302 @@
 from lifelines import CoxPHFitter
+from lifelines.fitters.coxph_fitter import SemiParametricPHFitter
 import numpy as np
 import pandas as pd
-from itertools import combinations
+from contextlib import contextmanager, nullcontext
+from itertools import combinations, repeat
+
+from survival_analysis.cox_engine import RiskSetCox
+from survival_analysis.fit_cache import cache_settings, cached_fit, get_fit_cache, install_worker_cache
+from survival_analysis.shared_cohort import is_categorical_like, resolve_n_jobs, shared_pool, worker_frame
+
+# Engines built in a worker process, one per (duration_col, event_col) of the shared cohort
+_WORKER_ENGINES = {}
+
+class DummyEncoder:
+    """
+    One-hot encoder for the categorical columns of a cohort, built in a single pass.
+
+    A column is encoded if it contains missing values or has object/categorical dtype (reference level:
+    its most frequent value; string columns included), or if it is an integer column that is not a 0/1 indicator (reference
+    level: 0 when present, otherwise its most frequent value). Dummy columns are named
+    `{column}_{level}` as with `pd.get_dummies`, the reference level is dropped, and rows with missing
+    or unseen values get zeros in every dummy. The detected levels are kept, so the same encoding
+    can be re-applied to new data with `transform`.
+
+    Parameters:
+        sparse (bool): Store the dummies as sparse uint8 columns instead of dense uint8.
+        verbose (bool): Print the encoded columns and their dropped reference columns.
+    """
+
+    def __init__(self, sparse=False, verbose=False):
+        self.sparse = sparse
+        self.verbose = verbose
+        self.encodings_ = None
+
+    def fit(self, data):
+        """
+        Detects the columns to encode and records their levels and reference levels.
+
+        Parameters:
+            data (pd.DataFrame): The cohort to learn the encoding from.
+
+        Returns:
+            DummyEncoder: The fitted encoder.
+        """
+        self.encodings_ = {}
+        for col in data.columns:
+            series = data[col]
+            if series.isnull().values.any() or is_categorical_like(series.dtype):
+                reason = 'empty data'
+                counts = series.value_counts()
+                reference = counts.idxmax()
+            elif (pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+                  and not (series.min() == 0 and series.max() == 1)):
+                reason = 'categorical intigers suspected'
+                counts = series.value_counts()
+                reference = 0 if 0 in counts.index else counts.idxmax()
+            else:
+                continue
+
+            levels = (sorted(counts.index, key=str) if series.dtype == 'O' or isinstance(series.dtype, pd.StringDtype)
+                      else sorted(counts.index))
+            self.encodings_[col] = {'levels': list(levels), 'reference': reference}
+            if self.verbose:
+                print(col, f' needs a dummy variable: {reason}')
+                print("The column will be dropped: ", f"{col}_{reference}")
+        return self
+
+    def transform(self, data):
+        """
+        Applies the fitted encoding to `data`, replacing each encoded column by its dummies in place.
+
+        Parameters:
+            data (pd.DataFrame): A frame with the columns the encoder was fitted on.
+
+        Returns:
+            pd.DataFrame: The encoded design matrix.
+        """
+        if self.encodings_ is None:
+            raise RuntimeError("DummyEncoder must be fitted before calling transform().")
+
+        columns = {}
+        for col in data.columns:
+            if col not in self.encodings_:
+                columns[col] = data[col]
+                continue
+
+            levels = self.encodings_[col]['levels']
+            reference = self.encodings_[col]['reference']
+            codes = pd.Categorical(data[col], categories=levels).codes
+            for code, level in enumerate(levels):
+                if level == reference:
+                    continue
+                values = (codes == code).astype(np.uint8)
+                if self.sparse:
+                    values = pd.arrays.SparseArray(values, fill_value=0)
+                columns[f"{col}_{level}"] = values
+
+        return pd.DataFrame(columns, index=data.index)
+
+    def fit_transform(self, data):
+        """
+        Fits the encoder on `data` and returns its encoded design matrix.
+        """
+        return self.fit(data).transform(data)
+
 
 def create_dummies(data):
-    for col in data:
-        print(col)
-        if data[col].isnull().values.any() or data[col].dtype =='O':
-            print(col, ' needs a dummy variable: empty data')
-
-            column_to_drop = str(col)+"_"+str(data[col].value_counts().idxmax())
-            print("The column will be dropped: ",column_to_drop)
-            data = pd.get_dummies(data, columns = [col], drop_first=False)
-            data = data.loc[:, data.columns!=str(column_to_drop)]
-            
-            
-        if data[col].dtype=='int64' and (data[col].min!=0 or data[col].max!=1):
-            print(col, ' needs a dummy variable: categorical intigers suspected')
-            
-            column_to_drop = str(col)+"_"+str(0)
-            print("The column will be dropped: ",column_to_drop)
-            data = pd.get_dummies(data, columns = [col], drop_first=False)
-            data = data.loc[:, data.columns!=str(column_to_drop)]  
-            
-    return(data)
+    """
+    Replaces the categorical columns of `data` by dummy variables (see `DummyEncoder` for the rules).
+
+    Parameters:
+        data (pd.DataFrame): The cohort to encode.
+
+    Returns:
+        pd.DataFrame: The encoded data.
+    """
+    return DummyEncoder(verbose=True).fit_transform(data)
+
+
+def _make_engine(data, duration_col, event_col, backend):
+    """
+    Returns the `RiskSetCox` engine for the 'numpy' backend, or None for lifelines.
+    """
+    if backend == 'numpy':
+        return RiskSetCox(data, duration_col, event_col)
+    if backend != 'lifelines':
+        raise ValueError(f"Unknown backend {backend!r}; use 'lifelines' or 'numpy'.")
+    return None
 
 
-def backward_elimination_AIC(data, duration_col='uve_to_MS_years', event_col='first_uve_MS'):
+@contextmanager
+def _counting_newton_steps():
+    """
+    Counts the Newton-Raphson iterations of the lifelines Cox fits run inside the block. lifelines
+    evaluates the gradient and Hessian of an unstratified model once per iteration, through the
+    calculator returned by `SemiParametricPHFitter._choose_gradient_calculator`, which is wrapped for
+    the duration of the block.
+
+    Yields:
+        list: A one-element list holding the number of iterations so far.
+    """
+    counter = [0]
+    choose = SemiParametricPHFitter._choose_gradient_calculator
+
+    def counting_calculator(self, *args, **kwargs):
+        get_gradients = choose(self, *args, **kwargs)
+
+        def counted(*gradient_args, **gradient_kwargs):
+            counter[0] += 1
+            return get_gradients(*gradient_args, **gradient_kwargs)
+        return counted
+
+    SemiParametricPHFitter._choose_gradient_calculator = counting_calculator
+    try:
+        yield counter
+    finally:
+        SemiParametricPHFitter._choose_gradient_calculator = choose
+
+
+def _fit_cox(data, features, duration_col, event_col, penalizer=0.0, initial_point=None,
+             count_iterations=False, engine=None):
+    """
+    Fits a Cox model on `features` of `data`; the single place where elimination routines fit models.
+
+    When `count_iterations` is set, the number of Newton-Raphson iterations lifelines needed is
+    counted from its gradient evaluations and stored on the model as `n_iterations_`. When an `engine`
+    is given, the fit runs on its precomputed risk sets instead of lifelines. Fits go through the
+    installed `fit_cache`, if any, except counted fits: a cached model would carry the iteration
+    count of an earlier fit, or none at all.
+    """
+    def fit():
+        if engine is not None:
+            return engine.fit(features, penalizer=penalizer, initial_point=initial_point)
+
+        model = CoxPHFitter(penalizer=penalizer)
+        fit_data = data[list(features) + [duration_col, event_col]]
+        if not count_iterations:
+            model.fit(fit_data, duration_col=duration_col, event_col=event_col, initial_point=initial_point)
+            return model
+
+        with _counting_newton_steps() as iterations:
+            model.fit(fit_data, duration_col=duration_col, event_col=event_col, initial_point=initial_point)
+        model.n_iterations_ = iterations[0]
+        return model
+
+    if count_iterations:
+        return fit()
+    return cached_fit(fit, data, features, duration_col, event_col, penalizer=penalizer,
+                      backend='lifelines' if engine is None else 'numpy')
+
+
+def _cached_model(data, features, duration_col, event_col, engine=None):
+    """
+    Returns the cached unpenalized fit of `features`, or None if there is no cache or no entry.
+    """
+    cache = get_fit_cache()
+    if cache is None:
+        return None
+    return cache.get(cache.key(data, features, duration_col, event_col, penalizer=0.0,
+                               backend='lifelines' if engine is None else 'numpy'))
+
+
+def _warm_start_point(parent_model, features):
+    """
+    Returns the parent model's coefficients for `features` on the standardised scale lifelines
+    iterates on, for use as the `initial_point` of a nested refit.
+    """
+    scaled = parent_model.params_ * parent_model._norm_std
+    return scaled[list(features)].to_numpy(dtype=float, copy=True)
+
+
+def _worker_setup(duration_col, event_col, backend, cache_dir, max_disk_bytes):
+    """
+    Prepares a pool worker for fitting: installs a disk-only fit cache when the parent's cache has a
+    disk tier, and returns the shared cohort with its (per-worker, built once) Cox engine.
+    """
+    install_worker_cache(cache_dir, max_disk_bytes)
+    data = worker_frame()
+    key = (duration_col, event_col, backend)
+    if key not in _WORKER_ENGINES:
+        _WORKER_ENGINES[key] = _make_engine(data, duration_col, event_col, backend)
+    return data, _WORKER_ENGINES[key]
+
+
+def _candidate_AIC(features, duration_col, event_col, initial_point=None, count_iterations=False,
+                   backend='lifelines', cache_dir=None, max_disk_bytes=None):
+    """
+    Worker task: fits one candidate subset against the shared cohort and returns its partial AIC
+    and the number of Newton-Raphson iterations used (0 if not counted). When the parent's fit cache
+    has a disk tier, the worker stores its fits there too.
+    """
+    data, engine = _worker_setup(duration_col, event_col, backend, cache_dir, max_disk_bytes)
+    model = _fit_cox(data, features, duration_col, event_col, initial_point=initial_point,
+                     count_iterations=count_iterations, engine=engine)
+    return model.AIC_partial_, getattr(model, 'n_iterations_', 0)
+
+
+def _candidate_stats(features, duration_col, event_col, feature, backend='lifelines',
+                     cache_dir=None, max_disk_bytes=None):
+    """
+    Worker task: fits one candidate subset against the shared cohort and returns its partial AIC
+    and the p-value of `feature` in it.
+    """
+    data, engine = _worker_setup(duration_col, event_col, backend, cache_dir, max_disk_bytes)
+    model = _fit_cox(data, features, duration_col, event_col, engine=engine)
+    return model.AIC_partial_, model.summary.loc[feature, 'p']
+
+
+def _evaluate_candidates(data, candidates, initial_points, duration_col, event_col,
+                         executor=None, count_iterations=False, engine=None):
+    """
+    Exactly refits each candidate feature list, serially or on the shared-cohort pool.
+
+    Returns:
+        list: One (AIC, iterations, model) tuple per candidate, in submission order. The model is None
+            when the fit ran in a worker process.
+    """
+    if executor is not None:
+        # Only fits missing from the cache are sent to the pool; counted fits always run
+        evaluated = [None if count_iterations else _cached_model(data, candidate, duration_col, event_col, engine)
+                     for candidate in candidates]
+        pending = [i for i, model in enumerate(evaluated) if model is None]
+        cache_dir, max_disk_bytes = cache_settings()
+
+        # map() preserves submission order, so ties resolve exactly as in the serial loop
+        backend = 'lifelines' if engine is None else 'numpy'
+        results = executor.map(_candidate_AIC, [candidates[i] for i in pending], repeat(duration_col),
+                               repeat(event_col), [initial_points[i] for i in pending],
+                               repeat(count_iterations), repeat(backend), repeat(cache_dir),
+                               repeat(max_disk_bytes))
+        for i, (aic, iterations) in zip(pending, results):
+            evaluated[i] = (aic, iterations, None)
+        return [result if isinstance(result, tuple) else (result.AIC_partial_, 0, result)
+                for result in evaluated]
+
+    evaluated = []
+    for candidate, initial_point in zip(candidates, initial_points):
+        model = _fit_cox(data, candidate, duration_col, event_col, initial_point=initial_point,
+                         count_iterations=count_iterations, engine=engine)
+        evaluated.append((model.AIC_partial_, getattr(model, 'n_iterations_', 0), model))
+    return evaluated
+
+
+def _first_best(evaluated):
+    """
+    Returns the index of the lowest AIC in `evaluated` (a dict keyed by candidate position),
+    taking the earliest candidate on ties as the exhaustive loop does.
+    """
+    best_index, best_AIC = None, float('inf')
+    for i in sorted(evaluated):
+        if evaluated[i][0] < best_AIC:
+            best_index, best_AIC = i, evaluated[i][0]
+    return best_index
+
+
+def backward_elimination_AIC(data, duration_col='uve_to_MS_years', event_col='first_uve_MS', n_jobs=1,
+                             warm_start=False, screen=None, screen_audit=False, backend='lifelines',
+                             return_trace=False):
     """
     Perform backward elimination by first checking the model with all features and then testing all possible sub-combinations 
     of features at each step based on AIC, always retaining features that contain 'age' and 'sex' in their names.
@@ -35,65 +305,145 @@ def backward_elimination_AIC(data, duration_col='uve_to_MS_years', event_col='fi
         data (DataFrame): The dataset containing all necessary columns.
         duration_col (str): The name of the column representing the duration until the event.
         event_col (str): The name of the column representing the event occurrence (binary).
+        n_jobs (int): Number of worker processes used to fit the candidates of each step (-1 for all cores).
+            The cohort is written once to a memory-mapped array shared by the workers. Candidates are
+            compared in the same order as the serial path, so the selected model is identical.
+        warm_start (bool): Start each candidate's Newton-Raphson fit from the current best model's
+            coefficients (minus the dropped feature) instead of from zero.
+        screen (int, optional): Rank the candidate drops by the Wald approximation
+            AIC + z**2 - 2 from the current fit and refit only the `screen` best-ranked candidates.
+            Before elimination stops, the remaining candidates are refitted so that the final set
+            is validated by exact partial AIC.
+        screen_audit (bool): With `screen`, also refit every candidate at each step and report how often
+            the screened choice agreed with the exhaustive search. The selection path is unchanged.
+        backend (str): 'lifelines' fits every candidate with `CoxPHFitter`; 'numpy' fits them with
+            `cox_engine.RiskSetCox`, which sorts the cohort and builds its risk sets once. The returned
+            model is refitted with `CoxPHFitter` either way.
+        return_trace (bool): Also return a per-step DataFrame with the number of candidates and refits, the best
+            candidate AIC, the Newton-Raphson iterations used, the approximate iterations saved (relative to
+            the cold-started initial fit) and, when auditing, screen agreement.
 
     Returns:
         list, CoxPHFitter: The best combination of features and the corresponding fitted model.
+        DataFrame: The per-step trace, only if `return_trace` is True.
     """
     # Identify features that must always be retained (features containing 'age' or 'sex')
     mandatory_features = [col for col in data.columns if 'age' in col.lower() or 'sex' in col.lower()]
     features = [col for col in data.columns if col not in [event_col, duration_col] + mandatory_features]
+    count_iterations = warm_start or return_trace or screen_audit
 
     # Start with all features, including mandatory ones
     all_features = features + mandatory_features
 
+    engine = _make_engine(data[all_features + [duration_col, event_col]], duration_col, event_col, backend)
+
     # Fit the initial model with all candidate features
-    initial_model = CoxPHFitter()
-    initial_model.fit(data[all_features + [duration_col, event_col]], duration_col=duration_col, event_col=event_col)
+    initial_model = _fit_cox(data, all_features, duration_col, event_col,
+                             count_iterations=count_iterations, engine=engine)
     best_AIC = initial_model.AIC_partial_
     best_features = all_features
     best_model = initial_model
+    # Iterations of a cold start, the reference for the iterations saved by warm starts
+    cold_iterations = getattr(initial_model, 'n_iterations_', 0)
+    trace = []
 
     print(f"Initial model with all features AIC: {best_AIC}")
 
-    # Iteratively remove one feature at a time
-    while features:
-        current_best_AIC = float('inf')
-        current_best_combo = None
-        current_best_model = None
-
-        # Generate all combinations of features with one less feature at each step
-        for combo in combinations(features, len(features) - 1):
-            current_features = list(combo) + mandatory_features + [duration_col, event_col]
-            model = CoxPHFitter()
-            model.fit(data[current_features], duration_col=duration_col, event_col=event_col)
-            current_AIC = model.AIC_partial_
-
-            # Find the best combination at this level
-            if current_AIC < current_best_AIC:
-                current_best_AIC = current_AIC
-                current_best_combo = combo
-                current_best_model = model
-
-        # Compare the best combination of the current step with the overall best
-        if current_best_AIC + 2 < best_AIC:
-            best_AIC = current_best_AIC
-            features = list(current_best_combo)  # Reduce the feature set for the next iteration
-            best_features = features + mandatory_features
-            best_model = current_best_model
-            print(f"Reduced to features {best_features} with AIC: {best_AIC}")
-        else:
-            print(f"No further improvement;"
-                  +f" best acheived was {current_best_AIC}\n"+
-                  "stopping elimination.")
-            break
-
+    parallel = resolve_n_jobs(n_jobs) > 1 and len(features) > 1
+    pool = (shared_pool(data[all_features + [duration_col, event_col]], n_jobs)
+            if parallel else nullcontext())
+
+    with pool as executor:
+        # Iteratively remove one feature at a time
+        while features:
+            # Generate all combinations of features with one less feature at each step
+            combos = list(combinations(features, len(features) - 1))
+            candidates = [list(combo) + mandatory_features for combo in combos]
+            evaluated = {}
+
+            def evaluate(indices):
+                indices = [i for i in indices if i not in evaluated]
+                initial_points = [_warm_start_point(best_model, candidates[i]) if warm_start else None
+                                  for i in indices]
+                results = _evaluate_candidates(data, [candidates[i] for i in indices], initial_points,
+                                               duration_col, event_col, executor, count_iterations, engine)
+                evaluated.update(zip(indices, results))
+
+            if screen:
+                # Wald approximation to the AIC of each candidate: dropping a feature with statistic z
+                # raises -2 log-likelihood by about z**2 and removes one parameter
+                z = best_model.summary['z']
+                approx_AIC = [best_AIC + z[next(f for f in features if f not in combo)] ** 2 - 2
+                              for combo in combos]
+                ranked = sorted(range(len(combos)), key=lambda i: approx_AIC[i])
+                evaluate(ranked[:screen])
+                screened_best = _first_best(evaluated)
+                if screen_audit:
+                    evaluate(range(len(combos)))
+                    agreed = screened_best == _first_best(evaluated)
+                    evaluated = {i: evaluated[i] for i in ranked[:screen]}
+            else:
+                evaluate(range(len(combos)))
+
+            best_index = _first_best(evaluated)
+            current_best_AIC = evaluated[best_index][0]
+            if screen and not current_best_AIC + 2 < best_AIC and len(evaluated) < len(combos):
+                # Validate the stopping decision with exact refits of the candidates the screen skipped
+                n_screened = len(evaluated)
+                evaluate(range(len(combos)))
+                best_index = _first_best(evaluated)
+                current_best_AIC = evaluated[best_index][0]
+                print(f"Validated the screen with {len(evaluated) - n_screened} exact refits")
+
+            if count_iterations:
+                step_iterations = sum(result[1] for result in evaluated.values())
+                saved = cold_iterations * len(evaluated) - step_iterations
+                trace.append({'step': len(trace) + 1, 'n_features': len(features) + len(mandatory_features),
+                              'n_candidates': len(combos), 'n_refits': len(evaluated),
+                              'best_candidate_AIC': current_best_AIC,
+                              'iterations': step_iterations, 'iterations_saved_approx': saved})
+                if screen and screen_audit:
+                    trace[-1]['screen_agreed'] = agreed
+                if warm_start:
+                    print(f"Step {len(trace)}: {step_iterations} Newton-Raphson iterations, "
+                          f"~{saved} saved by warm starts")
+
+            # Compare the best combination of the current step with the overall best
+            if current_best_AIC + 2 < best_AIC:
+                best_AIC = current_best_AIC
+                features = list(combos[best_index])  # Reduce the feature set for the next iteration
+                best_features = features + mandatory_features
+                # Workers only return AICs; the selected candidate is refitted here
+                current_best_model = evaluated[best_index][2]
+                if current_best_model is None:
+                    current_best_model = _fit_cox(data, best_features, duration_col, event_col,
+                                                  initial_point=_warm_start_point(best_model, best_features)
+                                                  if warm_start else None, engine=engine)
+                best_model = current_best_model
+                print(f"Reduced to features {best_features} with AIC: {best_AIC}")
+            else:
+                print(f"No further improvement;"
+                      +f" best acheived was {current_best_AIC}\n"+
+                      "stopping elimination.")
+                break
+
+    if screen and screen_audit and trace:
+        agreement = pd.DataFrame(trace)['screen_agreed']
+        print(f"Screen agreed with exhaustive search in {agreement.sum()}/{len(agreement)} steps")
+
+    if engine is not None:
+        best_model = _fit_cox(data, best_features, duration_col, event_col,
+                              initial_point=_warm_start_point(best_model, best_features))
+
+    if return_trace:
+        return best_features, best_model, pd.DataFrame(trace)
     return best_features, best_model
 
 
 #    return best_features, best_model
 
 def backward_elimination_p(data, duration_col='uve_to_MS_years', event_col='first_uve_MS', significance_level=0.05,
-                          penalizer = 0.002):
+                          penalizer = 0.002, warm_start=False, backend='lifelines', return_trace=False):
     """
     Perform backward elimination based on p-values from a Cox Proportional Hazards model,
     ensuring features related to 'age' and 'sex' are always retained.
@@ -103,9 +453,17 @@ def backward_elimination_p(data, duration_col='uve_to_MS_years', event_col='firs
         duration_col (str): Column name for the duration from event diagnosis to the event.
         event_col (str): Column name for the event indicator (1 if event occurred, 0 otherwise).
         significance_level (float): The p-value threshold above which a feature should be considered for removal.
+        warm_start (bool): Start each refit from the previous model's coefficients, minus the removed feature,
+            instead of from zero.
+        backend (str): 'lifelines' or 'numpy'; with 'numpy' the elimination fits run on
+            `cox_engine.RiskSetCox` and only the final model is fitted with `CoxPHFitter`.
+        return_trace (bool): Also return a per-step DataFrame with the removed feature, its p-value and
+            the Newton-Raphson iterations used and the approximate iterations saved relative to the
+            cold-started first fit.
 
     Returns:
-        tuple: A tuple containing the list of remaining features after elimination and the final Cox model.
+        tuple: A tuple containing the list of remaining features after elimination and the final Cox model,
+            plus the per-step trace if `return_trace` is True.
     """
     # Identify features that must always be retained (features containing 'age' or 'sex')
     mandatory_features = [col for col in data.columns if 'age' in col.lower() or 'sex' in col.lower()]
@@ -113,11 +471,27 @@ def backward_elimination_p(data, duration_col='uve_to_MS_years', event_col='firs
     # Initial set of features excludes the duration and event columns and mandatory features
     features = [col for col in data.columns if col not in [event_col, duration_col] + mandatory_features]
     all_features = mandatory_features + features  # Full feature set including mandatory features
+    count_iterations = warm_start or return_trace
+    engine = _make_engine(data[all_features + [duration_col, event_col]], duration_col, event_col, backend)
+
+    model = None
+    cold_iterations = None
+    trace = []
 
     while len(features) > 0:
-        model = CoxPHFitter(penalizer=penalizer).fit(data[all_features + [duration_col, event_col]], duration_col=duration_col, event_col=event_col)
+        initial_point = _warm_start_point(model, all_features) if warm_start and model is not None else None
+        model = _fit_cox(data, all_features, duration_col, event_col, penalizer=penalizer,
+                         initial_point=initial_point, count_iterations=count_iterations, engine=engine)
         p_values = model.summary['p']
 
+        if count_iterations:
+            iterations = getattr(model, 'n_iterations_', None)
+            cold_iterations = iterations if cold_iterations is None else cold_iterations
+            saved = None if iterations is None or cold_iterations is None else cold_iterations - iterations
+            trace.append({'step': len(trace) + 1, 'n_features': len(all_features),
+                          'removed': None, 'p': None, 'iterations': iterations,
+                          'iterations_saved_approx': saved})
+
         # Exclude mandatory features from the removal candidates
         removable_p_values = p_values.drop(index=mandatory_features, errors='ignore')
 
@@ -127,40 +501,149 @@ def backward_elimination_p(data, duration_col='uve_to_MS_years', event_col='firs
             features.remove(worst_feature)  # Remove the feature with the highest p-value from features
             all_features.remove(worst_feature)  # Also remove it from all_features
             print(f"Removed {worst_feature} with p-value: {max_p_value}")
+            if count_iterations:
+                trace[-1].update(removed=worst_feature, p=max_p_value)
+                if warm_start:
+                    print(f"Step {len(trace)}: {iterations} Newton-Raphson iterations, "
+                          f"~{saved} saved by warm starts")
         else:
             print("No further improvements; p-values are below the significance level.")
             break
     
     # Fit the final model with the retained features
-    final_model = CoxPHFitter().fit(data[all_features + [duration_col, event_col]], duration_col=duration_col, event_col=event_col)
+    initial_point = _warm_start_point(model, all_features) if warm_start and model is not None else None
+    final_model = _fit_cox(data, all_features, duration_col, event_col, initial_point=initial_point)
+    if return_trace:
+        return all_features, final_model, pd.DataFrame(trace)
     return all_features, final_model
 
 
 
-def stepwise_selection(data, target,SL_in=0.05,SL_out = 0.05):
-    initial_features = data.columns.tolist()
-    best_features = []
-    while (len(initial_features)>0):
-        remaining_features = list(set(initial_features)-set(best_features))
-        new_pval = pd.Series(index=remaining_features)
-        for new_column in remaining_features:
-            model = sm.OLS(target, sm.add_constant(data[best_features+[new_column]])).fit()
-            new_pval[new_column] = model.pvalues[new_column]
-        min_p_value = new_pval.min()
-        if(min_p_value<SL_in):
-            best_features.append(new_pval.idxmin())
-            while(len(best_features)>0):
-                best_features_with_constant = sm.add_constant(data[best_features])
-                p_values = sm.OLS(target, best_features_with_constant).fit().pvalues[1:]
-                max_p_value = p_values.max()
-                if(max_p_value >= SL_out):
-                    excluded_feature = p_values.idxmax()
-                    best_features.remove(excluded_feature)
+def _candidate_statistics(data, candidates, features, duration_col, event_col, executor=None, engine=None):
+    """
+    Fits each candidate feature list, serially or on the shared-cohort pool, and returns one
+    (AIC, p-value of the matching entry of `features`) tuple per candidate, in order.
+    """
+    if executor is not None:
+        backend = 'lifelines' if engine is None else 'numpy'
+        cache_dir, max_disk_bytes = cache_settings()
+        return list(executor.map(_candidate_stats, candidates, repeat(duration_col), repeat(event_col),
+                                 features, repeat(backend), repeat(cache_dir), repeat(max_disk_bytes)))
+
+    statistics = []
+    for candidate, feature in zip(candidates, features):
+        model = _fit_cox(data, candidate, duration_col, event_col, engine=engine)
+        statistics.append((model.AIC_partial_, model.summary.loc[feature, 'p']))
+    return statistics
+
+
+def stepwise_selection(data, duration_col='uve_to_MS_years', event_col='first_uve_MS', criterion='p',
+                       SL_in=0.05, SL_out=0.05, base_features=None, n_jobs=1, backend='lifelines'):
+    """
+    Perform bidirectional (forward-backward) stepwise selection for a Cox Proportional Hazards model,
+    always retaining features that contain 'age' and 'sex' in their names.
+
+    Each step fits every not-yet-selected feature added to the current model and enters the best one;
+    features that no longer meet the exit rule are then removed one at a time. With criterion 'p' a
+    feature enters if its p-value is below `SL_in` and leaves if it reaches `SL_out`; with criterion
+    'aic' a feature enters or leaves if that lowers the partial AIC.
+
+    Parameters:
+        data (pd.DataFrame): The dataset containing the patient data.
+        duration_col (str): Column name for the duration until the event.
+        event_col (str): Column name for the event indicator (1 if event occurred, 0 otherwise).
+        criterion (str): 'p' for p-value entry/exit thresholds or 'aic' for partial AIC.
+        SL_in (float): Entry p-value threshold (criterion 'p').
+        SL_out (float): Exit p-value threshold (criterion 'p').
+        base_features (list, optional): Features the search starts from in addition to the mandatory ones.
+        n_jobs (int): Number of worker processes used to evaluate the candidates of each step (-1 for all cores).
+        backend (str): 'lifelines' or 'numpy' (see `backward_elimination_AIC`).
+
+    Returns:
+        list, CoxPHFitter, DataFrame: The selected features, the final model and a per-step trace
+            of the entered and removed features.
+    """
+    if criterion not in ('p', 'aic'):
+        raise ValueError(f"Unknown criterion {criterion!r}; use 'p' or 'aic'.")
+
+    # Identify features that must always be retained (features containing 'age' or 'sex')
+    mandatory_features = [col for col in data.columns if 'age' in col.lower() or 'sex' in col.lower()]
+    candidate_features = [col for col in data.columns if col not in [event_col, duration_col] + mandatory_features]
+    selected = [col for col in (base_features or []) if col not in mandatory_features]
+    all_features = candidate_features + mandatory_features
+
+    engine = _make_engine(data[all_features + [duration_col, event_col]], duration_col, event_col, backend)
+    # Without mandatory or base features this is the null model, whose partial AIC entries must beat
+    current_AIC = _fit_cox(data, mandatory_features + selected, duration_col, event_col, engine=engine).AIC_partial_
+    trace = []
+    visited = {frozenset(selected)}
+
+    parallel = resolve_n_jobs(n_jobs) > 1 and len(candidate_features) > 1
+    pool = (shared_pool(data[all_features + [duration_col, event_col]], n_jobs)
+            if parallel else nullcontext())
+
+    with pool as executor:
+        while True:
+            # Forward step: evaluate every entry candidate against the current model
+            remaining = [col for col in candidate_features if col not in selected]
+            if not remaining:
+                break
+            statistics = _candidate_statistics(data, [mandatory_features + selected + [col] for col in remaining],
+                                               remaining, duration_col, event_col, executor, engine)
+            AICs = [aic for aic, _ in statistics]
+            p_values = [p for _, p in statistics]
+
+            if criterion == 'p':
+                best = int(np.argmin(p_values))
+                enters = p_values[best] < SL_in
+            else:
+                best = int(np.argmin(AICs))
+                enters = AICs[best] < current_AIC
+            if not enters or frozenset(selected + [remaining[best]]) in visited:
+                print("No further features meet the entry criterion; stopping selection.")
+                break
+
+            selected.append(remaining[best])
+            visited.add(frozenset(selected))
+            current_AIC = AICs[best]
+            trace.append({'step': len(trace) + 1, 'action': 'enter', 'feature': remaining[best],
+                          'p': p_values[best], 'AIC': current_AIC, 'n_features': len(selected)})
+            print(f"Entered {remaining[best]} with p-value: {p_values[best]} and AIC: {current_AIC}")
+
+            # Backward step: remove features that no longer meet the exit criterion
+            while selected:
+                if criterion == 'p':
+                    model = _fit_cox(data, mandatory_features + selected, duration_col, event_col, engine=engine)
+                    removable = model.summary['p'].drop(index=mandatory_features, errors='ignore')
+                    worst = removable.idxmax()
+                    if removable[worst] < SL_out:
+                        break
+                    removed_p = removable[worst]
+                    selected.remove(worst)
+                    current_AIC = _fit_cox(data, mandatory_features + selected, duration_col, event_col,
+                                           engine=engine).AIC_partial_
                 else:
-                    break 
-        else:
-            break
-    return best_features
+                    drops = [mandatory_features + [col for col in selected if col != feature] for feature in selected]
+                    drop_AICs = [aic for aic, _, _ in _evaluate_candidates(data, drops, [None] * len(drops),
+                                                                           duration_col, event_col, executor,
+                                                                           engine=engine)]
+                    worst_index = int(np.argmin(drop_AICs))
+                    if not drop_AICs[worst_index] < current_AIC:
+                        break
+                    worst = selected[worst_index]
+                    model = _fit_cox(data, mandatory_features + selected, duration_col, event_col, engine=engine)
+                    removed_p = model.summary.loc[worst, 'p']
+                    selected.remove(worst)
+                    current_AIC = drop_AICs[worst_index]
+
+                visited.add(frozenset(selected))
+                trace.append({'step': len(trace) + 1, 'action': 'remove', 'feature': worst,
+                              'p': removed_p, 'AIC': current_AIC, 'n_features': len(selected)})
+                print(f"Removed {worst} with p-value: {removed_p} and AIC: {current_AIC}")
+
+    final_features = mandatory_features + selected
+    final_model = _fit_cox(data, final_features, duration_col, event_col)
+    return final_features, final_model, pd.DataFrame(trace)
 
 
 # def backward_elimination_AIC(data, significance_level = 0.05):
@@ -0,0 +1,110 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from survival_analysis.model_artifact import CoxModelArtifact
+from survival_analysis.utilities_mod import time_list
+
+
+def _as_artifact(model):
+    """
+    Accepts a `CoxModelArtifact`, a fitted `CoxPHFitter`, or the path of either saved by
+    `prepare_and_save_model` (.npz artifact or .pkl pickle), and returns an artifact.
+    """
+    if isinstance(model, CoxModelArtifact):
+        return model
+    if isinstance(model, (str, os.PathLike)):
+        if str(model).endswith('.npz'):
+            return CoxModelArtifact.load(model)
+        with open(model, 'rb') as file:
+            model = pickle.load(file)
+    return CoxModelArtifact.from_fitter(model)
+
+
+def _source_columns(source, sep):
+    if isinstance(source, pd.DataFrame):
+        return list(source.columns)
+    if str(source).endswith('.parquet'):
+        return pq.ParquetFile(source).schema_arrow.names
+    return list(pd.read_csv(source, sep=sep, nrows=0).columns)
+
+
+def _iter_chunks(source, columns, chunksize, sep):
+    """
+    Yields the cohort in row chunks holding only `columns`.
+    """
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize][columns]
+    elif str(source).endswith('.parquet'):
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, sep=sep, usecols=columns, chunksize=chunksize, low_memory=False)
+
+
+def score_cohort(source, models, output_path, times=time_list, id_col=None, chunksize=100_000,
+                 sep='\t', log_partial_hazard=True):
+    """
+    Streams the cohort through several saved Cox models and writes, for every participant, each
+    model's log partial hazard and survival probabilities at `times` to a Parquet file.
+
+    The cohort is read `chunksize` rows at a time and only the covariates the models use are loaded,
+    so memory stays flat regardless of cohort size. Each chunk is scored with exp(X @ coef) times the
+    baseline cumulative hazard at `times`, which is interpolated once per model up front.
+    Participants with a missing covariate get NaN scores for that model.
+
+    Parameters:
+        source (str or pd.DataFrame): Cohort TSV/CSV, a Parquet file (e.g. the `cohort_loader` cache) or a DataFrame.
+        models (dict): Model name -> `CoxModelArtifact`, fitted `CoxPHFitter`, or path to a saved .npz/.pkl model.
+        output_path (str): Destination Parquet file.
+        times (list, optional): Times to evaluate survival at. Defaults to `utilities_mod.time_list`.
+        id_col (str, optional): Participant identifier column to carry over to the output.
+        chunksize (int, optional): Number of rows scored at a time.
+        sep (str, optional): Field separator when `source` is a delimited text file.
+        log_partial_hazard (bool, optional): Whether to also write each model's log partial hazard.
+
+    Returns:
+        str: `output_path`.
+    """
+    models = {name: _as_artifact(model) for name, model in models.items()}
+    times = np.asarray(times, dtype=float)
+    baselines = {name: model.baseline_cumulative_hazard_at(times) for name, model in models.items()}
+
+    columns = [id_col] if id_col is not None else []
+    for model in models.values():
+        columns += [col for col in model.features if col not in columns]
+    missing = set(columns) - set(_source_columns(source, sep))
+    if missing:
+        raise ValueError(f"Columns required by the models are missing from the cohort: {sorted(missing)}")
+
+    writer = None
+    n_scored = 0
+    try:
+        for chunk in _iter_chunks(source, columns, chunksize, sep):
+            scores = {} if id_col is None else {id_col: chunk[id_col].to_numpy()}
+            for name, model in models.items():
+                X = chunk[model.features].to_numpy(dtype=float)
+                lp = (X - model.norm_mean) @ model.coef
+                if log_partial_hazard:
+                    scores[f"{name}_log_partial_hazard"] = lp
+                survival = np.exp(-np.exp(lp)[:, None] * baselines[name][None, :])
+                for j, t in enumerate(times):
+                    scores[f"{name}_survival_{t:g}"] = survival[:, j]
+
+            table = pa.Table.from_pandas(pd.DataFrame(scores), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+            n_scored += len(chunk)
+            print(f"Scored {n_scored} participants", end='\r')
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Scored {n_scored} participants with {len(models)} models; saved to {output_path}")
+    return output_path
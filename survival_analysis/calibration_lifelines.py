@@ -3,6 +3,8 @@
 
 # -*- coding: utf-8 -*-
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -10,47 +12,60 @@ import matplotlib.pyplot as plt
 from lifelines.utils import CensoringType
 from lifelines.fitters import RegressionFitter
 from lifelines import CRCSplineFitter
+from scipy import stats
 
+from survival_analysis.shared_cohort import resolve_n_jobs, shared_pool, worker_frame
 
-def survival_probability_calibration(model: RegressionFitter, df: pd.DataFrame, t0: float, ax=None, left_y_axis=False, right_y_axis=False, event='AS', n_knots=3):
-    r"""
-    Smoothed calibration curves for time-to-event models. This is analogous to
-    calibration curves for classification models, extended to handle survival probabilities
-    and censoring. Produces a matplotlib figure and some metrics.
-    We want to calibrate our model's prediction of :math:`P(T < \text{t0})` against the observed frequencies.
-    Parameters
-    -------------
-    model:
-        a fitted lifelines regression model to be evaluated
-    df: DataFrame
-        a DataFrame - if equal to the training data, then this is an in-sample calibration. Could also be an out-of-sample
-        dataset.
-    t0: float
-        the time to evaluate the probability of event occurring prior at.
-    Returns
-    ----------
-    ax:
-        mpl axes
-    ICI:
-        mean absolute difference between predicted and observed
-    E50:
-        median absolute difference between predicted and observed
-    https://onlinelibrary.wiley.com/doi/full/10.1002/sim.8570
+
+def ccl(p):
     """
+    Complementary log-log transform of event probabilities, the covariate of the calibration spline.
+    """
+    return np.log(-np.log(1 - p))
 
-    def ccl(p):
-        return np.log(-np.log(1 - p))
 
-    if ax is None:
-        ax = plt.gca()
+def _censoring_kind(model):
+    if CensoringType.is_left_censoring(model):
+        return 'left'
+    if CensoringType.is_interval_censoring(model):
+        return 'interval'
+    return 'right'
 
-    T = model.duration_col
-    E = model.event_col
 
-    predictions_at_t0 = np.clip(1 - model.predict_survival_function(df, times=[t0]).T.squeeze(), 1e-10, 0.2 - 1e-10)
+def predict_event_probabilities(model, df, times, max_probability=0.2):
+    """
+    Predicted probabilities of an event by each of `times`, from a single vectorized
+    `predict_survival_function` call, clipped to (0, max_probability) as in the calibration plots.
+
+    Parameters:
+        model: A fitted lifelines regression model (or a `CoxModelArtifact`).
+        df (pd.DataFrame): The evaluation data.
+        times (list): Horizons.
+        max_probability (float): Upper clip of the predictions.
+
+    Returns:
+        pd.DataFrame: One column per horizon, indexed like `df`.
+    """
+    survival = model.predict_survival_function(df, times=list(times)).T
+    survival.index = df.index
+    survival.columns = list(times)
+    return np.clip(1 - survival, 1e-10, max_probability - 1e-10)
 
+
+def _fit_calibration_spline(predictions, durations, events, t0, T, E, censoring='right', max_probability=0.2,
+                            n_grid=100):
+    """
+    Fits the flexible calibration model of observed survival on ccl(predicted risk at t0) and
+    evaluates it on a grid and at every prediction.
+
+    Returns:
+        dict: t0, ICI, E50, the curve ('x', 'y') and the predictions, plain arrays only so that the
+            result can come back from a worker process.
+    """
+    predictions = pd.Series(np.asarray(predictions, dtype=float))
     # create new dataset with the predictions
-    prediction_df = pd.DataFrame({"ccl_at_%d" % t0: ccl(predictions_at_t0), T: df[T], E: df[E]})
+    prediction_df = pd.DataFrame({"ccl_at_%d" % t0: ccl(predictions),
+                                  T: np.asarray(durations), E: np.asarray(events)})
 
     # fit new dataset to flexible spline model
     # this new model connects prediction probabilities and actual survival. It should be very flexible, almost to the point of overfitting. It's goal is just to smooth out the data!
@@ -63,17 +78,257 @@ def survival_probability_calibration(model: RegressionFitter, df: pd.DataFrame,
     crc = CRCSplineFitter(n_baseline_knots=2, penalizer=0.000001)
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore")
-        if CensoringType.is_right_censoring(model):
+        if censoring == 'right':
             crc.fit_right_censoring(prediction_df, T, E, regressors=regressors)
-        elif CensoringType.is_left_censoring(model):
+        elif censoring == 'left':
             crc.fit_left_censoring(prediction_df, T, E, regressors=regressors)
-        elif CensoringType.is_interval_censoring(model):
+        elif censoring == 'interval':
             crc.fit_interval_censoring(prediction_df, T, E, regressors=regressors)
 
     # predict new model at values 0 to 1, but remember to ccl it!
-    x = np.linspace(np.clip(predictions_at_t0.min() - 0.01, 0, 0.2), np.clip(0.75, 0, 0.2), 100)
+    x = np.linspace(np.clip(predictions.min() - 0.01, 0, max_probability), np.clip(0.75, 0, max_probability), n_grid)
     y = 1 - crc.predict_survival_function(pd.DataFrame({"ccl_at_%d" % t0: ccl(x)}), times=[t0]).T.squeeze()
 
+    deltas = ((1 - crc.predict_survival_function(prediction_df, times=[t0])).T.squeeze() - predictions).abs()
+    return {'t0': t0, 'ICI': deltas.mean(), 'E50': np.percentile(deltas, 50),
+            'x': x, 'y': np.asarray(y), 'predictions': predictions.to_numpy()}
+
+
+def _fit_calibration_spline_task(args):
+    return _fit_calibration_spline(*args)
+
+
+def calibration_curves(models, df, times=(5, 10, 20), n_jobs=1, max_probability=0.2):
+    """
+    Smoothed calibration of one or several models at several horizons: predictions for all horizons
+    come from one vectorized call per model, and the per-(model, horizon) calibration splines are
+    fitted in a process pool with `n_jobs` > 1. Nothing is plotted; pass the returned curves to
+    `plot_calibration_curve`.
+
+    Parameters:
+        models (dict or model): Model name -> fitted lifelines regression model, or a single model.
+        df (pd.DataFrame or dict): Evaluation data, shared by all models or keyed like `models`.
+        times (list, optional): Horizons t0.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        max_probability (float): Upper clip of the predictions and of the plotted range.
+
+    Returns:
+        pd.DataFrame, dict: One row per (model, t0) with n, ICI and E50, and the computed curves keyed
+            by (model, t0), each a dict with 'x', 'y' and 'predictions'.
+    """
+    if not isinstance(models, dict):
+        models = {'model': models}
+    frames = df if isinstance(df, dict) else {name: df for name in models}
+
+    jobs, keys = [], []
+    for name, model in models.items():
+        data = frames[name]
+        T, E = model.duration_col, model.event_col
+        predictions = predict_event_probabilities(model, data, times, max_probability)
+        for t0 in times:
+            keys.append((name, t0))
+            jobs.append((predictions[t0].to_numpy(), data[T].to_numpy(), data[E].to_numpy(), t0, T, E,
+                         _censoring_kind(model), max_probability))
+
+    if resolve_n_jobs(n_jobs) > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=resolve_n_jobs(n_jobs)) as executor:
+            results = list(executor.map(_fit_calibration_spline_task, jobs))
+    else:
+        results = [_fit_calibration_spline(*job) for job in jobs]
+
+    curves = dict(zip(keys, results))
+    table = pd.DataFrame([{'model': name, 't0': t0, 'n': len(curve['predictions']),
+                           'ICI': curve['ICI'], 'E50': curve['E50']} for (name, t0), curve in curves.items()])
+    return table, curves
+
+
+def _bootstrap_replicate(data, seed, times, T, E, censoring, max_probability):
+    """
+    Refits the calibration splines of all horizons on one bootstrap resample of the evaluation rows,
+    reusing the precomputed predictions in `data` (columns 'risk_<t0>', T and E).
+
+    Returns:
+        list: One (t0, ICI, E50) tuple per horizon; NaNs where the spline fit failed.
+    """
+    rng = np.random.default_rng(seed)
+    sample = data.iloc[rng.integers(0, len(data), len(data))]
+    results = []
+    for t0 in times:
+        try:
+            curve = _fit_calibration_spline(sample[f"risk_{t0}"], sample[T], sample[E], t0, T, E,
+                                            censoring, max_probability, n_grid=2)
+            results.append((t0, curve['ICI'], curve['E50']))
+        except Exception:  # a failed replicate is recorded, not fatal
+            results.append((t0, np.nan, np.nan))
+    return results
+
+
+def _bootstrap_replicate_task(seed, times, T, E, censoring, max_probability):
+    """
+    Worker task: runs `_bootstrap_replicate` on the shared predictions.
+    """
+    return _bootstrap_replicate(worker_frame(), seed, times, T, E, censoring, max_probability)
+
+
+def calibration_bootstrap(model, df, times=(5, 10, 20), n_bootstrap=200, alpha=0.05, seed=0, n_jobs=1,
+                          max_probability=0.2):
+    """
+    Percentile bootstrap confidence intervals for ICI and E50 at each horizon. The model's predictions
+    are computed once; each replicate resamples the evaluation rows and refits only the calibration
+    splines. Replicates get reproducible seeds (spawned from `seed`) and run in a process pool with
+    `n_jobs` > 1, sharing the predictions through `shared_pool`.
+
+    Parameters:
+        model: A fitted lifelines regression model.
+        df (pd.DataFrame): The evaluation data.
+        times (list, optional): Horizons t0.
+        n_bootstrap (int): Number of bootstrap replicates.
+        alpha (float): 1 - confidence level of the intervals.
+        seed (int): Seed the replicate seeds are spawned from.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        max_probability (float): Upper clip of the predictions.
+
+    Returns:
+        pd.DataFrame, pd.DataFrame: One row per t0 with the point estimates, the CI bounds and the number
+            of successful replicates, and the long table of replicate estimates.
+    """
+    T, E = model.duration_col, model.event_col
+    censoring = _censoring_kind(model)
+    predictions = predict_event_probabilities(model, df, times, max_probability)
+    data = pd.DataFrame({f"risk_{t0}": predictions[t0].to_numpy() for t0 in times})
+    data[T] = df[T].to_numpy()
+    data[E] = df[E].to_numpy()
+
+    point = {t0: _fit_calibration_spline(data[f"risk_{t0}"], data[T], data[E], t0, T, E, censoring,
+                                         max_probability, n_grid=2) for t0 in times}
+    seeds = [child.generate_state(1)[0] for child in np.random.SeedSequence(seed).spawn(n_bootstrap)]
+    args = (list(times), T, E, censoring, max_probability)
+    if resolve_n_jobs(n_jobs) > 1:
+        with shared_pool(data, n_jobs) as executor:
+            replicates = list(executor.map(_bootstrap_replicate_task, seeds,
+                                           *[[arg] * n_bootstrap for arg in args]))
+    else:
+        replicates = [_bootstrap_replicate(data, replicate_seed, *args) for replicate_seed in seeds]
+
+    replicates = pd.DataFrame([{'replicate': i, 't0': t0, 'ICI': ICI, 'E50': E50}
+                               for i, result in enumerate(replicates) for t0, ICI, E50 in result])
+    rows = []
+    for t0, group in replicates.dropna().groupby('t0'):
+        rows.append({'t0': t0, 'ICI': point[t0]['ICI'],
+                     'ICI_lower': group['ICI'].quantile(alpha / 2), 'ICI_upper': group['ICI'].quantile(1 - alpha / 2),
+                     'E50': point[t0]['E50'],
+                     'E50_lower': group['E50'].quantile(alpha / 2), 'E50_upper': group['E50'].quantile(1 - alpha / 2),
+                     'n_bootstrap': len(group)})
+    return pd.DataFrame(rows), replicates
+
+
+def _grouped_kaplan_meier(groups, durations, events, t0, n_groups):
+    """
+    Kaplan-Meier survival at t0 and its Greenwood variance for every group at once, from a single
+    sort of the rows by (group, time) and bincount sums over the distinct (group, time) pairs.
+    """
+    order = np.lexsort((durations, groups))
+    g, T, E = groups[order], durations[order], events[order]
+    new_pair = np.r_[True, (g[1:] != g[:-1]) | (T[1:] != T[:-1])]
+    pair = np.cumsum(new_pair) - 1
+    pair_start = np.flatnonzero(new_pair)
+    deaths = np.bincount(pair, weights=E)
+    pair_group, pair_time = g[pair_start], T[pair_start]
+
+    group_size = np.bincount(g, minlength=n_groups)
+    group_first = np.r_[0, np.cumsum(group_size)[:-1]]
+    at_risk = group_size[pair_group] - (pair_start - group_first[pair_group])
+
+    use = (pair_time <= t0) & (deaths > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_terms = np.where(use, np.log1p(-deaths / at_risk), 0.0)
+        greenwood_terms = np.where(use & (at_risk > deaths), deaths / (at_risk * (at_risk - deaths)), 0.0)
+    survival = np.exp(np.bincount(pair_group, weights=log_terms, minlength=n_groups))
+    variance = survival ** 2 * np.bincount(pair_group, weights=greenwood_terms, minlength=n_groups)
+    return survival, variance
+
+
+def grouped_calibration(model, df, times=(5, 10, 20), n_groups=10):
+    """
+    Grouped calibration at each horizon, a fast alternative to the spline calibration: rows are
+    binned into `n_groups` quantile groups of predicted risk at t0, and the observed risk of every
+    group is one minus its Kaplan-Meier estimate at t0, computed for all groups in one vectorized pass.
+    Apart from the sort by (group, time), the cost is linear in n and nothing is fitted iteratively.
+
+    Metrics per horizon:
+        - calibration intercept and slope: weighted least squares of observed on predicted group risk,
+          weighted by the inverse Greenwood variances (ideal 0 and 1);
+        - ICI: mean absolute difference between observed and predicted group risk, weighted by group size;
+        - chi2 and p: Greenwood-variance Hosmer-Lemeshow-type statistic (D'Agostino-Nam), sum of
+          (observed - predicted)^2 / var over groups, against chi-squared with n_groups - 1 df.
+
+    Parameters:
+        model: A fitted lifelines regression model (or a `CoxModelArtifact` with duration/event metadata).
+        df (pd.DataFrame): The evaluation data.
+        times (list, optional): Horizons t0.
+        n_groups (int): Number of quantile groups.
+
+    Returns:
+        pd.DataFrame, pd.DataFrame: One row per (t0, group) with n, predicted and observed risk and
+            its standard error, and one row per t0 with the metrics.
+    """
+    T = getattr(model, 'duration_col', None) or model.metadata['duration_col']
+    E = getattr(model, 'event_col', None) or model.metadata['event_col']
+    durations = df[T].to_numpy(dtype=float)
+    events = df[E].to_numpy(dtype=float)
+    predictions = predict_event_probabilities(model, df, times, max_probability=1.0)
+    n = len(df)
+
+    groups_table, metrics = [], []
+    for t0 in times:
+        risk = predictions[t0].to_numpy()
+        # Equal-sized quantile groups by predicted risk
+        groups = np.empty(n, dtype=int)
+        groups[np.argsort(risk, kind='stable')] = np.arange(n) * n_groups // n
+        size = np.bincount(groups, minlength=n_groups)
+        predicted = np.bincount(groups, weights=risk, minlength=n_groups) / size
+
+        survival, variance = _grouped_kaplan_meier(groups, durations, events, t0, n_groups)
+        observed = 1 - survival
+
+        with np.errstate(divide='ignore'):
+            weight = np.where(variance > 0, 1 / variance, 0.0)
+        if (weight > 0).sum() >= 2:
+            design = np.column_stack([np.ones(n_groups), predicted]) * np.sqrt(weight)[:, None]
+            intercept, slope = np.linalg.lstsq(design, observed * np.sqrt(weight), rcond=None)[0]
+        else:
+            intercept = slope = np.nan
+        chi2 = ((observed - predicted) ** 2 * weight).sum()
+
+        groups_table.append(pd.DataFrame({'t0': t0, 'group': np.arange(n_groups), 'n': size,
+                                          'predicted': predicted, 'observed': observed,
+                                          'observed_se': np.sqrt(variance)}))
+        metrics.append({'t0': t0, 'calibration_intercept': intercept, 'calibration_slope': slope,
+                        'ICI': np.average(np.abs(observed - predicted), weights=size),
+                        'chi2': chi2, 'df': n_groups - 1, 'p': stats.chi2.sf(chi2, n_groups - 1)})
+    return pd.concat(groups_table, ignore_index=True), pd.DataFrame(metrics)
+
+
+def plot_calibration_curve(curve, ax=None, left_y_axis=False, right_y_axis=False, event='AS', max_probability=0.2):
+    """
+    Draws a calibration curve computed by `calibration_curves` in the style of
+    `survival_probability_calibration`: the curve, the x=y line and a histogram of the predictions.
+
+    Parameters:
+        curve (dict): One entry of the curves returned by `calibration_curves`.
+        ax: Matplotlib axes; the current axes if None.
+        left_y_axis (bool): Whether to label the left y-axis.
+        right_y_axis (bool): Whether to label the histogram axis.
+        event (str): Event name used in the axis labels.
+        max_probability (float): Upper limit of both axes.
+
+    Returns:
+        ax: The axes.
+    """
+    if ax is None:
+        ax = plt.gca()
+    t0, x, y = curve['t0'], curve['x'], curve['y']
+
     # plot our results
     #ax.set_title("Smoothed calibration curve of \npredicted vs observed probabilities of t ≤ %d mortality" % t0)
 
@@ -86,8 +341,8 @@ def survival_probability_calibration(model: RegressionFitter, df: pd.DataFrame,
         ax.set_ylabel(f"Observed probability of \n {event} at t ≤ 5, 10, 20 years", color=color)
     ax.tick_params(axis="y", labelcolor=color)
     
-    ax.set_xlim([0,0.2])
-    ax.set_ylim([0,0.2])
+    ax.set_xlim([0,max_probability])
+    ax.set_ylim([0,max_probability])
 
     # plot x=y line
     ax.plot(x, x, c="k", ls="--")
@@ -99,14 +354,48 @@ def survival_probability_calibration(model: RegressionFitter, df: pd.DataFrame,
     if right_y_axis == True:
         twin_ax.set_ylabel("Count of \npredicted probabilities", color=color)  # we already handled the x-label with ax1
     twin_ax.tick_params(axis="y", labelcolor=color)
-    twin_ax.hist(predictions_at_t0, alpha=0.3, bins="sqrt", color=color)
+    twin_ax.hist(curve['predictions'], alpha=0.3, bins="sqrt", color=color)
     
     plt.tight_layout()
+    return ax
+
+
+def survival_probability_calibration(model: RegressionFitter, df: pd.DataFrame, t0: float, ax=None, left_y_axis=False, right_y_axis=False, event='AS', n_knots=3):
+    r"""
+    Smoothed calibration curves for time-to-event models. This is analogous to
+    calibration curves for classification models, extended to handle survival probabilities
+    and censoring. Produces a matplotlib figure and some metrics.
+    We want to calibrate our model's prediction of :math:`P(T < \text{t0})` against the observed frequencies.
+    For several horizons or models at once, use `calibration_curves` and `plot_calibration_curve`.
+    Parameters
+    -------------
+    model:
+        a fitted lifelines regression model to be evaluated
+    df: DataFrame
+        a DataFrame - if equal to the training data, then this is an in-sample calibration. Could also be an out-of-sample
+        dataset.
+    t0: float
+        the time to evaluate the probability of event occurring prior at.
+    Returns
+    ----------
+    ax:
+        mpl axes
+    ICI:
+        mean absolute difference between predicted and observed
+    E50:
+        median absolute difference between predicted and observed
+    https://onlinelibrary.wiley.com/doi/full/10.1002/sim.8570
+    """
+    T = model.duration_col
+    E = model.event_col
+
+    predictions_at_t0 = predict_event_probabilities(model, df, [t0])[t0]
+    curve = _fit_calibration_spline(predictions_at_t0, df[T], df[E], t0, T, E, _censoring_kind(model))
+    ax = plot_calibration_curve(curve, ax=ax, left_y_axis=left_y_axis, right_y_axis=right_y_axis, event=event)
 
-    deltas = ((1 - crc.predict_survival_function(prediction_df, times=[t0])).T.squeeze() - predictions_at_t0).abs()
-    ICI = deltas.mean()
-    E50 = np.percentile(deltas, 50)
+    ICI = curve['ICI']
+    E50 = curve['E50']
     # print("ICI = ", ICI)
     # print("E50 = ", E50)
 
-    return ax, ICI, E50
\ No newline at end of file
+    return ax, ICI, E50
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _file_sha256(path, chunk_size=16 * 1024 ** 2):
+    """
+    Streams `path` through SHA-256 and returns the hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(source, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source)), '.cohort_cache')
+    name = os.path.splitext(os.path.basename(source))[0]
+    return cache_dir, os.path.join(cache_dir, f"{name}.parquet"), os.path.join(cache_dir, f"{name}.meta.json")
+
+
+def _source_fingerprint(source, meta):
+    """
+    Returns the SHA-256 of `source`, reusing the hash recorded in `meta` when the file's size and
+    modification time are unchanged, so that an unchanged file is not re-read on every load.
+    """
+    stat = os.stat(source)
+    if meta and meta.get('size') == stat.st_size and meta.get('mtime') == stat.st_mtime:
+        return meta['sha256']
+    return _file_sha256(source)
+
+
+def build_cohort_cache(source, cache_dir=None, sep='\t', force=False):
+    """
+    Converts the cohort TSV into a typed Parquet cache once; later calls return the existing cache
+    unless the source file's SHA-256 has changed (or `force` is set).
+
+    Object columns are stored as pandas strings so mixed-type columns convert cleanly.
+
+    Parameters:
+        source (str): Path to the cohort file, e.g. prefix + 'allGRS_forROCAUC_220524.tsv'.
+        cache_dir (str, optional): Cache directory. Defaults to '.cohort_cache' next to the source.
+        sep (str): Field separator of the source file.
+        force (bool): Rebuild the cache even if it is up to date.
+
+    Returns:
+        str: Path to the Parquet cache.
+    """
+    cache_dir, parquet_path, meta_path = _cache_paths(source, cache_dir)
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(parquet_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+
+    sha256 = _source_fingerprint(source, meta)
+    stat = os.stat(source)
+    if meta is not None and meta['sha256'] == sha256 and not force:
+        if meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime:
+            # Same content, new timestamp: record it so the next load skips hashing
+            meta.update(size=stat.st_size, mtime=stat.st_mtime)
+            with open(meta_path, 'w') as file:
+                json.dump(meta, file, indent=2)
+        return parquet_path
+
+    print(f"Building columnar cache of {source}")
+    os.makedirs(cache_dir, exist_ok=True)
+    data = pd.read_csv(source, sep=sep, low_memory=False)
+    for col in data.columns[data.dtypes == 'O']:
+        data[col] = data[col].astype('string')
+
+    tmp_path = parquet_path + '.tmp'
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+    with open(meta_path, 'w') as file:
+        json.dump({'source': os.path.abspath(source), 'sha256': sha256, 'size': stat.st_size,
+                   'mtime': stat.st_mtime, 'n_rows': len(data), 'columns': list(data.columns)}, file, indent=2)
+    return parquet_path
+
+
+def load_cohort(source, columns=None, filters=None, cache_dir=None, sep='\t'):
+    """
+    Loads the cohort from its columnar cache, reading only `columns` and only the rows matching
+    `filters`, which are pushed down to the Parquet reader. Builds or refreshes the cache first
+    if needed (see `build_cohort_cache`).
+
+    Parameters:
+        source (str): Path to the cohort TSV.
+        columns (list, optional): Columns to read; all columns if None.
+        filters (dict or list, optional): Row predicates, either {'uve_any': 1} for equality tests or
+            pyarrow-style tuples such as [('uve_any', '==', 1), ('age_uve_years', '>=', 18)].
+        cache_dir (str, optional): Cache directory. Defaults to '.cohort_cache' next to the source.
+        sep (str): Field separator of the source file.
+
+    Returns:
+        pd.DataFrame: The requested slice of the cohort.
+    """
+    parquet_path = build_cohort_cache(source, cache_dir=cache_dir, sep=sep)
+    if isinstance(filters, dict):
+        filters = [(col, '==', value) for col, value in filters.items()]
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    data = pd.read_parquet(parquet_path, columns=columns, filters=filters or None)
+    # Text columns are cached as strings; hand them out as object columns with NaN, as read_csv does
+    for col in data.columns:
+        if isinstance(data[col].dtype, pd.StringDtype):
+            data[col] = data[col].astype(object).where(data[col].notna(), np.nan)
+    return data
+
+
+def cph_columns(disease, grs, uve_col='uve_any', age_col='age_uve_years', add_columns=None,
+                duration_col=None, event_col=None):
+    """
+    Lists the cohort columns `prepare_cph_data` needs for one model, to pass to `load_cohort`.
+
+    Parameters:
+        disease (str): The base name of the disease column, appended with '_any'.
+        grs (str): Column name for the genetic risk score.
+        uve_col (str, optional): Column name indicating uveitis status. Defaults to 'uve_any'.
+        age_col (str, optional): Column name for age at uveitis diagnosis. Defaults to 'age_uve_years'.
+        add_columns (list, optional): Additional patient attributes to include.
+        duration_col (str, optional): Duration column name. Defaults based on disease if None.
+        event_col (str, optional): Event column name. Defaults based on disease if None.
+
+    Returns:
+        list: The column names.
+    """
+    disease_name = disease.strip('_any')
+    event_col = f'first_uve_{disease_name}' if event_col is None else event_col
+    duration_col = f'uve_to_{disease_name}_years' if duration_col is None else duration_col
+    return list(dict.fromkeys([uve_col, f"first_{disease_name}", grs, event_col, duration_col, age_col]
+                              + list(add_columns or [])))
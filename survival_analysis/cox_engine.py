@@ -0,0 +1,395 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.linalg import solve
+from lifelines.exceptions import ConvergenceWarning
+
+
+def _reverse_cumsum(values):
+    """
+    Sums of `values` from each row to the end of the (time-sorted) array, i.e. risk-set totals.
+    """
+    return np.cumsum(values[::-1], axis=0)[::-1]
+
+
+class RiskSetCox:
+    """
+    Cox proportional hazards engine with Efron ties that precomputes the sort order, tie groups and
+    risk-set boundaries of one (cohort, duration, event) tuple once, so that any subset of the
+    remaining columns can be fitted against the same structure.
+
+    Covariates are standardised the way lifelines does it, so penalizers, `initial_point` values and
+    the resulting coefficients, standard errors and partial AIC are directly comparable with
+    `CoxPHFitter`.
+
+    Parameters:
+        data (pd.DataFrame): The cohort; every column other than the duration and event columns is a candidate covariate.
+        duration_col (str): Column name for the duration until the event.
+        event_col (str): Column name for the event indicator (1 if event occurred, 0 otherwise).
+    """
+
+    def __init__(self, data, duration_col, event_col):
+        self.duration_col = duration_col
+        self.event_col = event_col
+
+        durations = data[duration_col].to_numpy(dtype=float)
+        events = data[event_col].to_numpy(dtype=float).astype(bool)
+        self._order = np.argsort(durations, kind='stable')
+        durations = durations[self._order]
+        events = events[self._order]
+
+        # Candidate covariates, time-sorted and converted once
+        self.columns = [col for col in data.columns if col not in (duration_col, event_col)]
+        self._X = data[self.columns].to_numpy(dtype=float)[self._order]
+        self._column_index = {col: j for j, col in enumerate(self.columns)}
+        self._mean = self._X.mean(0)
+        self._std = self._X.std(0, ddof=1)
+
+        # Tie groups: one per distinct event time, deaths are contiguous after sorting
+        self._death_rows = np.flatnonzero(events)
+        event_times, self._death_group, deaths_per_time = np.unique(
+            durations[self._death_rows], return_inverse=True, return_counts=True)
+        self._group_start = np.r_[0, np.cumsum(deaths_per_time)[:-1]]
+        # Risk set of each event time: every row with duration >= that time
+        self._risk_start = np.searchsorted(durations, event_times, side='left')
+
+        # Efron expansion: one entry per death with fraction l / d of its tie group removed
+        self._efron_fraction = ((np.arange(len(self._death_rows)) - self._group_start[self._death_group])
+                                / deaths_per_time[self._death_group])
+
+        self.durations = durations
+        self.events = events
+        self.n_obs = len(durations)
+        self.n_events = len(self._death_rows)
+        self.event_times = event_times
+
+    def _efron_means(self, X, xb):
+        """
+        Efron risk-set weights for sorted `X` with linear predictor `xb`.
+
+        Returns:
+            tuple: The (shifted) row weights exp(xb - shift), the shift, and for every death the Efron
+                denominator and the risk-weighted covariate mean.
+        """
+        shift = xb.max() if xb.size else 0.0
+        w = np.exp(xb - shift)
+        wX = w[:, None] * X
+
+        risk_w = _reverse_cumsum(w)[self._risk_start]
+        risk_X = _reverse_cumsum(wX)[self._risk_start]
+        n_groups = len(self._risk_start)
+        deaths = self._death_rows
+        death_w = np.bincount(self._death_group, weights=w[deaths], minlength=n_groups)
+        death_X = np.add.reduceat(wX[deaths], self._group_start, axis=0)
+
+        group = self._death_group
+        fraction = self._efron_fraction
+        denominator = risk_w[group] - fraction * death_w[group]
+        mean_X = (risk_X[group] - fraction[:, None] * death_X[group]) / denominator[:, None]
+        return w, shift, denominator, mean_X
+
+    def _efron_values(self, X, beta):
+        """
+        Log partial likelihood, gradient and Hessian with Efron ties at `beta` for standardised, sorted `X`.
+        """
+        xb = X @ beta
+        w, shift, denominator, mean_X = self._efron_means(X, xb)
+        n_groups = len(self._risk_start)
+        deaths = self._death_rows
+        group = self._death_group
+        fraction = self._efron_fraction
+
+        log_lik = xb[deaths].sum() - np.log(denominator).sum() - shift * len(deaths)
+        gradient = X[deaths].sum(0) - mean_X.sum(0)
+
+        # sum_{g,l} Rxx_g / den_gl collapses onto rows via cumulative risk-set membership
+        a = np.bincount(group, weights=1 / denominator, minlength=n_groups)
+        b = np.bincount(group, weights=fraction / denominator, minlength=n_groups)
+        row_weight = np.zeros(len(X))
+        np.add.at(row_weight, self._risk_start, a)
+        row_weight = np.cumsum(row_weight) * w
+        death_weight = w[deaths] * b[group]
+
+        information = ((X * row_weight[:, None]).T @ X
+                       - (X[deaths] * death_weight[:, None]).T @ X[deaths]
+                       - mean_X.T @ mean_X)
+        return log_lik, gradient, -information
+
+    def _standardised(self, features):
+        """
+        Sorted covariate matrix of `features`, standardised as lifelines does, with its means and stds.
+        """
+        idx = [self._column_index[col] for col in features]
+        mean, std = self._mean[idx], self._std[idx]
+        X = (self._X[:, idx] - mean) / std
+        if np.isnan(X).any():
+            raise ValueError("NaNs were detected in the covariates; drop or impute them before fitting.")
+        return X, mean, std
+
+    def fit(self, features, penalizer=0.0, l1_ratio=0.0, initial_point=None,
+            precision=1e-07, r_precision=1e-9, max_steps=500):
+        """
+        Fits the Cox model for a subset of the cohort's columns by Newton-Raphson.
+
+        Parameters:
+            features (list): Covariate columns to include.
+            penalizer (float): Elastic-net penalty strength, on lifelines' scale.
+            l1_ratio (float): Share of the penalty applied as (smoothed) L1, as in lifelines.
+            initial_point (np.ndarray, optional): Starting coefficients on the standardised scale.
+            precision (float): Stop when the norm of the Newton step falls below this value.
+            r_precision (float): Stop when the relative change in log-likelihood falls below this value.
+            max_steps (int): Maximum number of Newton-Raphson iterations.
+
+        Returns:
+            CoxEngineResult: The fitted model with a lifelines-compatible summary.
+        """
+        features = list(features)
+        X, mean, std = self._standardised(features)
+        n, d = X.shape
+        beta = np.zeros(d) if initial_point is None else np.array(initial_point, dtype=float)
+
+        def penalized(beta, i):
+            log_lik, gradient, hessian = self._efron_values(X, beta)
+            if np.any(penalizer > 0):
+                a = 1.3 ** i
+                soft_abs = (np.logaddexp(0, -a * beta) + np.logaddexp(0, a * beta)) / a
+                tanh = np.tanh(a * beta / 2)
+                log_lik -= n * (penalizer * (l1_ratio * soft_abs + 0.5 * (1 - l1_ratio) * beta ** 2)).sum()
+                gradient = gradient - n * penalizer * (l1_ratio * tanh + (1 - l1_ratio) * beta)
+                hessian = hessian - np.diag(n * penalizer * (l1_ratio * a / 2 * (1 - tanh ** 2) + (1 - l1_ratio))
+                                            * np.ones(d))
+            return log_lik, gradient, hessian
+
+        i, previous_log_lik, success = 1, None, False
+        log_lik, gradient, hessian = penalized(beta, i)
+        while True:
+            delta = solve(-hessian, gradient, assume_a='pos', check_finite=False) if d else np.zeros(0)
+            newton_decrement = gradient @ delta / 2
+
+            if (np.linalg.norm(delta) < precision or newton_decrement < precision or
+                    (previous_log_lik is not None and
+                     abs(log_lik - previous_log_lik) / -previous_log_lik < r_precision)):
+                success = True
+                break
+            if i >= max_steps:
+                break
+
+            # Newton step, halved while it does not improve the penalized likelihood
+            step = 1.0
+            while True:
+                candidate = beta + step * delta
+                candidate_values = penalized(candidate, i + 1)
+                if candidate_values[0] >= log_lik or step < 1e-5:
+                    break
+                step /= 2
+            previous_log_lik = log_lik
+            beta = candidate
+            log_lik, gradient, hessian = candidate_values
+            i += 1
+
+        if not success:
+            warnings.warn("Newton-Raphson failed to converge sufficiently.", ConvergenceWarning)
+
+        variance = np.linalg.inv(-hessian) / np.outer(std, std) if d else np.zeros((0, 0))
+        return CoxEngineResult(features, beta / std, variance, log_lik, n_iterations=i,
+                               norm_mean=mean, norm_std=std, duration_col=self.duration_col,
+                               event_col=self.event_col, penalizer=penalizer, l1_ratio=l1_ratio,
+                               n_obs=n, n_events=self.n_events)
+
+
+    def partial_log_likelihood(self, features, params):
+        """
+        Log partial likelihood (Efron ties) of this cohort at coefficients `params` (original scale),
+        e.g. to score coefficients estimated on another sample.
+        """
+        idx = [self._column_index[col] for col in features]
+        X = self._X[:, idx] - self._mean[idx]
+        xb = X @ np.asarray(params, dtype=float)
+        _, shift, denominator, _ = self._efron_means(X, xb)
+        return xb[self._death_rows].sum() - np.log(denominator).sum() - shift * self.n_events
+
+    def max_penalizer(self, features, l1_ratio=1.0, penalty_factor=None):
+        """
+        Smallest penalizer at which the elastic-net solution of `fit_path` has all penalized
+        coefficients at zero; unpenalized features (penalty factor 0) are fitted freely at that point.
+        For l1_ratio 0 (ridge), where no such value exists, an L1 share of 0.001 is assumed.
+        """
+        X, _, _ = self._standardised(features)
+        factor = np.ones(X.shape[1]) if penalty_factor is None else np.asarray(penalty_factor, dtype=float)
+        beta = np.zeros(X.shape[1])
+        free = factor == 0
+        if free.any():
+            beta[free] = self._proximal_newton(X[:, free], beta[free], 0.0, l1_ratio, 1e-07, 1e-9, 100, 1000)[0]
+        _, gradient, _ = self._efron_values(X, beta)
+        return np.abs(gradient[~free] / factor[~free]).max(initial=0.0) / (len(X) * max(l1_ratio, 1e-3))
+
+    def _proximal_newton(self, X, beta, penalizer, l1_ratio, precision, r_precision, max_steps, max_sweeps,
+                         penalty_factor=None):
+        """
+        Minimises the elastic-net penalized negative log partial likelihood by proximal Newton steps:
+        each step solves the penalized quadratic approximation by coordinate descent with
+        soft-thresholding, so coefficients reach exactly zero, followed by a halving line search.
+        Each coefficient's penalty is scaled by its `penalty_factor` (0 leaves it unpenalized).
+        """
+        n, d = X.shape
+        factor = np.ones(d) if penalty_factor is None else np.asarray(penalty_factor, dtype=float)
+        l1 = n * penalizer * l1_ratio * factor
+        l2 = n * penalizer * (1 - l1_ratio) * factor
+
+        def objective(beta, log_lik):
+            return -log_lik + l1 @ np.abs(beta) + 0.5 * (l2 * beta) @ beta
+
+        log_lik, gradient, hessian = self._efron_values(X, beta)
+        current = objective(beta, log_lik)
+        for i in range(1, max_steps + 1):
+            information = -hessian
+            target = beta.copy()
+            delta = np.zeros(d)
+            for _ in range(max_sweeps):
+                max_change = 0.0
+                for j in range(d):
+                    z = gradient[j] - information[j] @ delta + information[j, j] * target[j]
+                    updated = np.sign(z) * max(abs(z) - l1[j], 0.0) / (information[j, j] + l2[j])
+                    change = updated - target[j]
+                    if change != 0.0:
+                        delta[j] += change
+                        target[j] = updated
+                        max_change = max(max_change, abs(change))
+                if max_change < precision:
+                    break
+
+            step = 1.0
+            while True:
+                candidate = beta + step * delta
+                candidate_values = self._efron_values(X, candidate)
+                candidate_objective = objective(candidate, candidate_values[0])
+                if candidate_objective <= current or step < 1e-5:
+                    break
+                step /= 2
+
+            converged = (np.linalg.norm(step * delta) < precision or
+                         abs(current - candidate_objective) < r_precision * abs(current))
+            beta, current = candidate, candidate_objective
+            log_lik, gradient, hessian = candidate_values
+            if converged:
+                break
+        return beta, log_lik, i
+
+    def fit_path(self, features, penalizers, l1_ratio=1.0, precision=1e-07, r_precision=1e-9,
+                 max_steps=100, max_sweeps=1000, penalty_factor=None):
+        """
+        Fits elastic-net Cox models along a penalizer grid, warm-starting every fit from the solution
+        at the previous penalizer. Unlike `fit`, the L1 part is exact, so unselected coefficients are 0.
+
+        The penalty has lifelines' scale: n * penalizer * (l1_ratio * |b| + 0.5 * (1 - l1_ratio) * b^2)
+        on the standardised coefficients.
+
+        Parameters:
+            features (list): Covariate columns to include.
+            penalizers (array-like): Penalizer grid, best given in decreasing order.
+            l1_ratio (float): Share of the penalty applied as L1.
+            precision (float): Stop when the norm of the Newton step falls below this value.
+            r_precision (float): Stop when the relative change in the objective falls below this value.
+            max_steps (int): Maximum number of proximal Newton steps per penalizer.
+            max_sweeps (int): Maximum number of coordinate descent sweeps per step.
+            penalty_factor (array-like, optional): Per-feature multiplier of the penalty; 0 keeps a
+                feature unpenalized, e.g. age and sex. All ones if None.
+
+        Returns:
+            np.ndarray, np.ndarray, np.ndarray: Coefficients on the original scale (one row per
+                penalizer), the unpenalized log partial likelihoods and the number of Newton steps.
+        """
+        features = list(features)
+        X, _, std = self._standardised(features)
+        beta = np.zeros(X.shape[1])
+        coefs = np.zeros((len(penalizers), X.shape[1]))
+        log_liks = np.zeros(len(penalizers))
+        steps = np.zeros(len(penalizers), dtype=int)
+        for k, penalizer in enumerate(penalizers):
+            beta, log_liks[k], steps[k] = self._proximal_newton(X, beta, penalizer, l1_ratio, precision,
+                                                                r_precision, max_steps, max_sweeps,
+                                                                penalty_factor)
+            coefs[k] = beta / std
+        return coefs, log_liks, steps
+
+    def schoenfeld_residuals(self, features, params):
+        """
+        Schoenfeld residuals with Efron ties of a model with coefficients `params` (original scale)
+        on `features`, one row per death in time order, as lifelines computes them.
+
+        Parameters:
+            features (list): Covariate columns of the model.
+            params (array-like): Coefficients of the model, in `features` order.
+
+        Returns:
+            np.ndarray: Residuals of shape (n_events, len(features)).
+        """
+        idx = [self._column_index[col] for col in features]
+        # Centring does not change the residuals but keeps exp(xb) well scaled
+        X = self._X[:, idx] - self._mean[idx]
+        _, _, _, mean_X = self._efron_means(X, X @ np.asarray(params, dtype=float))
+        deaths_per_time = np.bincount(self._death_group)
+        group_mean = np.add.reduceat(mean_X, self._group_start, axis=0) / deaths_per_time[:, None]
+        return X[self._death_rows] - group_mean[self._death_group]
+
+    def kaplan_meier_at_deaths(self):
+        """
+        Kaplan-Meier survival estimate at each death's event time, in time order.
+        """
+        deaths_per_time = np.bincount(self._death_group)
+        at_risk = self.n_obs - self._risk_start
+        return np.cumprod(1 - deaths_per_time / at_risk)[self._death_group]
+
+
+class CoxEngineResult:
+    """
+    A Cox model fitted by `RiskSetCox`, exposing the attributes of `CoxPHFitter` the elimination
+    routines rely on (`params_`, `summary`, `AIC_partial_`, `log_likelihood_`, `variance_matrix_`).
+    """
+
+    def __init__(self, features, params, variance, log_likelihood, n_iterations, norm_mean, norm_std,
+                 duration_col, event_col, penalizer=0.0, l1_ratio=0.0, n_obs=None, n_events=None, alpha=0.05):
+        index = pd.Index(features, name='covariate')
+        self.params_ = pd.Series(params, index=index, name='coef')
+        self.variance_matrix_ = pd.DataFrame(variance, index=index, columns=index)
+        self.standard_errors_ = pd.Series(np.sqrt(np.diag(variance)), index=index, name='se')
+        self.log_likelihood_ = log_likelihood
+        self.AIC_partial_ = -2 * log_likelihood + 2 * len(features)
+        self.n_iterations_ = n_iterations
+        self._norm_mean = pd.Series(norm_mean, index=index)
+        self._norm_std = pd.Series(norm_std, index=index)
+        self.duration_col = duration_col
+        self.event_col = event_col
+        self.penalizer = penalizer
+        self.l1_ratio = l1_ratio
+        self.alpha = alpha
+        self.n_obs = n_obs
+        self.n_events = n_events
+
+    @property
+    def summary(self):
+        """
+        Summary table with the same columns as `CoxPHFitter.summary`.
+        """
+        ci = 100 * (1 - self.alpha)
+        z_crit = stats.norm.ppf(1 - self.alpha / 2)
+        se = self.standard_errors_
+        z = self.params_ / se
+        p = 2 * stats.norm.sf(np.abs(z))
+        df = pd.DataFrame({
+            'coef': self.params_,
+            'exp(coef)': np.exp(self.params_),
+            'se(coef)': se,
+            f'coef lower {ci:g}%': self.params_ - z_crit * se,
+            f'coef upper {ci:g}%': self.params_ + z_crit * se,
+        })
+        df[f'exp(coef) lower {ci:g}%'] = np.exp(df[f'coef lower {ci:g}%'])
+        df[f'exp(coef) upper {ci:g}%'] = np.exp(df[f'coef upper {ci:g}%'])
+        df['cmp to'] = 0.0
+        df['z'] = z
+        df['p'] = p
+        with np.errstate(divide='ignore'):
+            df['-log2(p)'] = -np.log2(p)
+        return df
@@ -0,0 +1,369 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from lifelines import CoxPHFitter
+
+from survival_analysis.cox_engine import RiskSetCox
+from survival_analysis.fit_cache import cache_settings, cached_fit, install_worker_cache
+from survival_analysis.shared_cohort import resolve_n_jobs, shared_pool, worker_frame
+from survival_analysis.utilities_mod import time_list
+
+
+# Fold assignments by (event column content, n_folds, seed), so models compare on identical folds
+_FOLD_CACHE = {}
+
+
+def stratified_folds(events, n_folds=5, seed=0):
+    """
+    Assigns every row to one of `n_folds` folds, spreading events and censored rows evenly.
+    Assignments are cached by the event column's content, `n_folds` and `seed`, so every model
+    evaluated on the same cohort sees identical folds.
+
+    Parameters:
+        events (array-like): Event indicator of every row.
+        n_folds (int): Number of folds.
+        seed (int): Seed of the random assignment.
+
+    Returns:
+        np.ndarray: The fold (0 to n_folds - 1) of every row.
+    """
+    events = np.asarray(events).astype(bool)
+    key = (hashlib.sha1(np.packbits(events).tobytes()).hexdigest(), len(events), n_folds, seed)
+    if key not in _FOLD_CACHE:
+        rng = np.random.default_rng(seed)
+        fold = np.empty(len(events), dtype=int)
+        for rows in (np.flatnonzero(events), np.flatnonzero(~events)):
+            fold[rng.permutation(rows)] = np.arange(len(rows)) % n_folds
+        fold.setflags(write=False)
+        _FOLD_CACHE[key] = fold
+    return _FOLD_CACHE[key]
+
+
+def _concordance_counts(durations, events, risk):
+    """
+    For every row with an event, counts the rows it is comparable with (longer duration, or censored
+    at the same time), and among those the concordant (lower risk) and risk-tied ones.
+
+    The pairs are counted in O(n log^2 n) with vectorized bottom-up merge counting over the rows
+    sorted by time, so no Python loop runs over rows.
+
+    Returns:
+        np.ndarray, np.ndarray, np.ndarray: Comparable, concordant and tied counts per row (0 for censored rows).
+    """
+    durations = np.asarray(durations, dtype=float)
+    events = np.asarray(events).astype(bool)
+    n = len(durations)
+
+    # Censored rows sort just after events at the same time, so they count as still at risk
+    key = 2 * np.unique(durations, return_inverse=True)[1] + (~events)
+    risk_rank = np.unique(np.asarray(risk, dtype=float), return_inverse=True)[1].astype(np.int64)
+    order = np.lexsort((-risk_rank, key))
+    key, rank, event = key[order], risk_rank[order], events[order]
+
+    concordant = np.zeros(n)
+    tied = np.zeros(n)
+    position = np.arange(n)
+    width = rank.max() + 1 if n else 1
+    size = 1
+    while size < n:
+        # Every earlier/later pair is counted at the level where it falls into adjacent blocks
+        block = position // size
+        pair = (block // 2).astype(np.int64)
+        left = block % 2 == 0
+        right_keys = np.sort(pair[~left] * width + rank[~left])
+        query = left & event
+        base = pair[query] * width
+        start = np.searchsorted(right_keys, base, 'left')
+        lower = np.searchsorted(right_keys, base + rank[query], 'left')
+        upper = np.searchsorted(right_keys, base + rank[query], 'right')
+        concordant[query] += lower - start
+        tied[query] += upper - lower
+        size *= 2
+
+    # Events tied in time are not comparable; within such a group rows are sorted by decreasing
+    # risk, so each row was paired with every later row of its group as concordant or tied
+    _, group_start, group_size = np.unique(key, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(group_start)), group_size)
+    later = group_start[group] + group_size[group] - 1 - position
+    _, run_start, run_size = np.unique(key * width + rank, return_index=True, return_counts=True)
+    run = np.repeat(np.arange(len(run_start)), run_size)
+    later_tied = run_start[run] + run_size[run] - 1 - position
+    concordant[event] -= (later - later_tied)[event]
+    tied[event] -= later_tied[event]
+
+    comparable = np.where(event, n - np.searchsorted(key, key, 'right'), 0)
+
+    unsorted = np.empty(n, dtype=int)
+    unsorted[order] = position
+    return comparable[unsorted], concordant[unsorted], tied[unsorted]
+
+
+def harrell_c(durations, events, risk):
+    """
+    Harrell's concordance index of risk scores (higher = earlier event), in O(n log^2 n).
+    Equals `lifelines.utils.concordance_index(durations, -risk, events)`.
+
+    Parameters:
+        durations (array-like): Observed durations.
+        events (array-like): Event indicators (1 if event occurred, 0 otherwise).
+        risk (array-like): Risk scores, e.g. the partial hazard or linear predictor.
+
+    Returns:
+        float: The C-index.
+    """
+    comparable, concordant, tied = _concordance_counts(durations, events, risk)
+    return (concordant.sum() + 0.5 * tied.sum()) / comparable.sum()
+
+
+def censoring_survival(durations, events):
+    """
+    Kaplan-Meier estimate of the censoring distribution, G(t-), as a function of t.
+
+    Parameters:
+        durations (array-like): Observed durations.
+        events (array-like): Event indicators; censored rows are the censoring "events".
+
+    Returns:
+        callable: Maps an array of times to the probability of remaining uncensored just before them.
+    """
+    durations = np.asarray(durations, dtype=float)
+    censored = ~np.asarray(events).astype(bool)
+    times, counts = np.unique(durations, return_counts=True)
+    at_risk = len(durations) - np.r_[0, np.cumsum(counts)[:-1]]
+    censorings = np.bincount(np.searchsorted(times, durations[censored]), minlength=len(times))
+    survival = np.r_[1.0, np.cumprod(1 - censorings / at_risk)]
+
+    def G(t):
+        return survival[np.searchsorted(times, np.asarray(t, dtype=float), 'left')]
+    return G
+
+
+def _inverse_probability(G):
+    """
+    1 / G, with weight 0 where G is 0 (times beyond the censoring distribution's support are dropped).
+    """
+    return np.divide(1.0, G, out=np.zeros_like(G), where=G > 0)
+
+
+def uno_c(durations, events, risk, tau=None, train_durations=None, train_events=None):
+    """
+    Uno's concordance index: Harrell's C with each event's pairs weighted by 1 / G(T_i-)^2, where G is
+    the censoring distribution, which makes it consistent under censoring that does not depend on the
+    risk. Only events before `tau`, and before the last time at which G is positive, are used.
+
+    Parameters:
+        durations, events, risk (array-like): Evaluation sample, as in `harrell_c`.
+        tau (float, optional): Truncation time; defaults to no truncation.
+        train_durations, train_events (array-like, optional): Sample to estimate G on; defaults to the
+            evaluation sample.
+
+    Returns:
+        float: The C-index.
+    """
+    durations = np.asarray(durations, dtype=float)
+    if train_durations is None:
+        train_durations, train_events = durations, events
+    G = censoring_survival(train_durations, train_events)
+    comparable, concordant, tied = _concordance_counts(durations, events, risk)
+    weight = _inverse_probability(G(durations)) ** 2
+    use = comparable > 0
+    if tau is not None:
+        use &= durations < tau
+    weight = np.where(use, weight, 0.0)
+    return (weight * (concordant + 0.5 * tied)).sum() / (weight * comparable).sum()
+
+
+def cumulative_dynamic_auc(durations, events, risk, times=time_list, train_durations=None, train_events=None):
+    """
+    Cumulative/dynamic time-dependent AUC with inverse-probability-of-censoring weights: at each
+    horizon t, cases are events by t (weighted by 1 / G(T_i-)) and controls are rows still event-free
+    after t. Risk scores are ranked once, and the controls below every case are counted for all
+    horizons together from one (risk rank x horizon) table.
+
+    Parameters:
+        durations, events, risk (array-like): Evaluation sample, as in `harrell_c`.
+        times (list, optional): Horizons. Defaults to `utilities_mod.time_list`.
+        train_durations, train_events (array-like, optional): Sample to estimate the censoring
+            distribution on; defaults to the evaluation sample.
+
+    Returns:
+        pd.Series: The AUC at every horizon (NaN where there are no cases or no controls).
+    """
+    durations = np.asarray(durations, dtype=float)
+    events = np.asarray(events).astype(bool)
+    if train_durations is None:
+        train_durations, train_events = durations, events
+    G = censoring_survival(train_durations, train_events)
+    weight = _inverse_probability(G(durations))
+
+    horizons = np.asarray(times, dtype=float)
+    order = np.argsort(horizons)
+    n_times = len(horizons)
+    rank = np.unique(np.asarray(risk, dtype=float), return_inverse=True)[1]
+    n_ranks = rank.max() + 1 if len(rank) else 0
+
+    # Rows are controls at the sorted horizons before the first one they reach
+    reached = np.searchsorted(horizons[order], durations, 'left')
+    table = np.bincount(rank * (n_times + 1) + reached, minlength=n_ranks * (n_times + 1))
+    table = table.reshape(n_ranks, n_times + 1)
+    controls = table[:, ::-1].cumsum(1)[:, ::-1][:, 1:]
+    below = controls.cumsum(0) - controls
+
+    case_rank = rank[events]
+    is_case = durations[events][:, None] <= horizons[order][None, :]
+    w = weight[events][:, None] * is_case
+    score = below[case_rank] + 0.5 * controls[case_rank]
+    n_controls = controls.sum(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        auc = (w * score).sum(0) / (w.sum(0) * n_controls)
+    auc = np.where(is_case.any(0) & (n_controls > 0), auc, np.nan)
+
+    result = np.empty(n_times)
+    result[order] = auc
+    return pd.Series(result, index=pd.Index(times, name='time'), name='auc')
+
+
+def _auc_replicate(data, seed, times):
+    """
+    Cumulative/dynamic AUC of one bootstrap resample of the rows of `data` (columns 'duration',
+    'event' and 'risk'); the censoring distribution is re-estimated on the resample.
+    """
+    rng = np.random.default_rng(seed)
+    sample = data.iloc[rng.integers(0, len(data), len(data))]
+    return cumulative_dynamic_auc(sample['duration'], sample['event'], sample['risk'], times).to_numpy()
+
+
+def _auc_replicate_task(seed, times):
+    """
+    Worker task: runs `_auc_replicate` on the shared predictions.
+    """
+    return _auc_replicate(worker_frame(), seed, times)
+
+
+def cumulative_dynamic_auc_bootstrap(durations, events, risk, times=time_list, n_bootstrap=200, alpha=0.05,
+                                     seed=0, n_jobs=1):
+    """
+    Percentile bootstrap confidence intervals of the cumulative/dynamic AUC at every horizon.
+    Replicates get reproducible seeds (spawned from `seed`) and run in a process pool with
+    `n_jobs` > 1, sharing the predictions through `shared_pool`.
+
+    Parameters:
+        durations, events, risk (array-like): Evaluation sample, as in `harrell_c`.
+        times (list, optional): Horizons. Defaults to `utilities_mod.time_list`.
+        n_bootstrap (int): Number of bootstrap replicates.
+        alpha (float): 1 - confidence level of the intervals.
+        seed (int): Seed the replicate seeds are spawned from.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+
+    Returns:
+        pd.DataFrame, pd.DataFrame: One row per horizon with the AUC, its CI bounds and the number of
+            replicates with a defined AUC, and the (replicate x horizon) table of replicate AUCs.
+    """
+    data = pd.DataFrame({'duration': np.asarray(durations, dtype=float),
+                         'event': np.asarray(events).astype(bool),
+                         'risk': np.asarray(risk, dtype=float)})
+    times = list(times)
+    point = cumulative_dynamic_auc(data['duration'], data['event'], data['risk'], times)
+    seeds = [child.generate_state(1)[0] for child in np.random.SeedSequence(seed).spawn(n_bootstrap)]
+    if resolve_n_jobs(n_jobs) > 1:
+        with shared_pool(data, n_jobs) as executor:
+            replicates = list(executor.map(_auc_replicate_task, seeds, [times] * n_bootstrap))
+    else:
+        replicates = [_auc_replicate(data, replicate_seed, times) for replicate_seed in seeds]
+
+    replicates = pd.DataFrame(np.vstack(replicates) if replicates else np.empty((0, len(times))),
+                              columns=pd.Index(times, name='time')).rename_axis('replicate')
+    summary = pd.DataFrame({'auc': point,
+                            'auc_lower': replicates.quantile(alpha / 2),
+                            'auc_upper': replicates.quantile(1 - alpha / 2),
+                            'n_bootstrap': replicates.notna().sum()})
+    return summary.rename_axis('time').reset_index(), replicates
+
+
+def _fit_fold_model(train, features, duration_col, event_col, penalizer, backend):
+    columns = features + [duration_col, event_col]
+    if backend == 'numpy':
+        return RiskSetCox(train[columns], duration_col, event_col).fit(features, penalizer=penalizer)
+    return cached_fit(lambda: CoxPHFitter(penalizer=penalizer).fit(train[columns], duration_col=duration_col,
+                                                                   event_col=event_col),
+                      train[columns], features, duration_col, event_col, penalizer=penalizer, backend='lifelines')
+
+
+def _evaluate_fold(data, fold, test_fold, name, features, duration_col, event_col, penalizer, times, backend):
+    """
+    Fits one model without fold `test_fold` and computes its discrimination metrics on the held-out rows.
+
+    Returns:
+        dict: The model name, fold, test size and metrics.
+    """
+    train = data[fold != test_fold]
+    test = data[fold == test_fold]
+    model = _fit_fold_model(train, features, duration_col, event_col, penalizer, backend)
+    risk = test[features].to_numpy(dtype=float) @ model.params_[features].to_numpy()
+
+    T, E = test[duration_col].to_numpy(dtype=float), test[event_col].to_numpy()
+    T_train, E_train = train[duration_col].to_numpy(dtype=float), train[event_col].to_numpy()
+    result = {'model': name, 'fold': test_fold, 'n_test': len(test), 'events_test': int(E.sum()),
+              'harrell_c': harrell_c(T, E, risk),
+              'uno_c': uno_c(T, E, risk, train_durations=T_train, train_events=E_train)}
+    auc = cumulative_dynamic_auc(T, E, risk, times, train_durations=T_train, train_events=E_train)
+    result.update({f'auc_{t:g}': value for t, value in auc.items()})
+    return result
+
+
+def _evaluate_fold_task(fold, test_fold, name, features, duration_col, event_col, penalizer, times, backend,
+                        cache_dir, max_disk_bytes):
+    """
+    Worker task: runs `_evaluate_fold` on the shared cohort.
+    """
+    install_worker_cache(cache_dir, max_disk_bytes)
+    return _evaluate_fold(worker_frame(), fold, test_fold, name, features, duration_col, event_col,
+                          penalizer, times, backend)
+
+
+def cross_validate_cox(data, models, duration_col='uve_to_MS_years', event_col='first_uve_MS', n_folds=5,
+                       times=time_list, penalizer=0.0, seed=0, n_jobs=1, backend='lifelines'):
+    """
+    Out-of-sample discrimination of Cox models by stratified k-fold cross-validation: every model is
+    refitted on each training split and scored on the held-out fold with Harrell's C, Uno's C and the
+    cumulative/dynamic AUC at `times`. All models use the same (cached) folds, stratified on the
+    event column, and the (model, fold) jobs run in a process pool with `n_jobs` > 1.
+
+    Parameters:
+        data (pd.DataFrame): The dataset, e.g. from `prepare_cph_data`.
+        models (dict or list): Model name -> feature list, or fitted model (e.g. from `fit_and_show_cph`
+            or `prepare_and_save_model`) whose covariates are used. A single list of features is one model.
+        duration_col (str): Column name for the duration until the event.
+        event_col (str): Column name for the event indicator (1 if event occurred, 0 otherwise).
+        n_folds (int): Number of folds.
+        times (list, optional): AUC horizons. Defaults to `utilities_mod.time_list`.
+        penalizer (float): Penalizer of the fold fits.
+        seed (int): Seed of the fold assignment.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        backend (str): 'lifelines' to fit with `CoxPHFitter` (through the fit cache) or 'numpy' for `RiskSetCox`.
+
+    Returns:
+        pd.DataFrame: One row per (model, fold) with the test size, events and metrics.
+    """
+    if isinstance(models, list):
+        models = {'model': models}
+    features = {name: list(model) if isinstance(model, (list, tuple, pd.Index)) else list(model.params_.index)
+                for name, model in models.items()}
+
+    needed = [col for feats in features.values() for col in feats] + [duration_col, event_col]
+    cohort = data[list(dict.fromkeys(needed))]
+    fold = stratified_folds(cohort[event_col], n_folds, seed)
+    jobs = [(name, feats, k) for name, feats in features.items() for k in range(n_folds)]
+
+    if resolve_n_jobs(n_jobs) > 1 and len(jobs) > 1:
+        cache_dir, max_disk_bytes = cache_settings()
+        with shared_pool(cohort, n_jobs) as executor:
+            futures = [executor.submit(_evaluate_fold_task, fold, k, name, feats, duration_col, event_col,
+                                       penalizer, times, backend, cache_dir, max_disk_bytes)
+                       for name, feats, k in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [_evaluate_fold(cohort, fold, k, name, feats, duration_col, event_col, penalizer, times, backend)
+                   for name, feats, k in jobs]
+    return pd.DataFrame(results)
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# The cache consulted by the model fitting routines; None disables caching
+_FIT_CACHE = None
+
+
+def set_fit_cache(cache):
+    """
+    Installs `cache` as the fit cache used by `backward_elimination_p`, `backward_elimination_AIC`,
+    `prepare_and_save_model` and `fit_and_show_cph`. Pass None to disable caching.
+
+    Parameters:
+        cache (CoxFitCache or None): The cache to use.
+
+    Returns:
+        CoxFitCache or None: The previously installed cache.
+    """
+    global _FIT_CACHE
+    previous, _FIT_CACHE = _FIT_CACHE, cache
+    return previous
+
+
+def get_fit_cache():
+    """
+    Returns the installed fit cache, or None if caching is disabled.
+    """
+    return _FIT_CACHE
+
+
+def cache_settings():
+    """
+    Returns the disk directory and size limit of the installed fit cache, (None, None) without one.
+    These are passed on to pool workers, which share the disk tier through `install_worker_cache`.
+    """
+    if _FIT_CACHE is None:
+        return None, None
+    return _FIT_CACHE.cache_dir, _FIT_CACHE.max_disk_bytes
+
+
+def install_worker_cache(cache_dir, max_disk_bytes):
+    """
+    Installs a disk-only fit cache in a pool worker when the parent's cache has a disk tier, and
+    disables caching otherwise. Does nothing if that cache is already installed.
+    """
+    if cache_dir is None:
+        set_fit_cache(None)
+    elif _FIT_CACHE is None or _FIT_CACHE.cache_dir != cache_dir or _FIT_CACHE.max_entries:
+        set_fit_cache(CoxFitCache(max_entries=0, cache_dir=cache_dir, max_disk_bytes=max_disk_bytes))
+
+
+def _column_hash(series):
+    """
+    Content hash of one column, including its index so that row subsets hash differently.
+    Numeric and boolean columns are hashed as float64, as the fitters see them, so that e.g. an int
+    column and its float copy in a shared cohort give the same key.
+    """
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        values = pd.util.hash_array(series.to_numpy(dtype=float, na_value=np.nan))
+        index = pd.util.hash_pandas_object(series.index).to_numpy()
+        return hashlib.sha1(values.tobytes() + index.tobytes()).hexdigest()
+    hashed = pd.util.hash_pandas_object(series, index=True).to_numpy()
+    return hashlib.sha1(hashed.tobytes() + str(series.dtype).encode()).hexdigest()
+
+
+class CoxFitCache:
+    """
+    Memoizes fitted Cox models by the content of the data they were fitted on, the sorted feature
+    list and the fitter options.
+
+    Models are kept in an in-memory LRU tier of at most `max_entries` models and, if `cache_dir` is
+    given, pickled to disk so they survive kernel restarts. The disk tier evicts the least recently
+    used files once it grows beyond `max_disk_bytes`.
+
+    Parameters:
+        max_entries (int): Maximum number of models held in memory.
+        cache_dir (str, optional): Directory for the on-disk tier; no disk tier if None.
+        max_disk_bytes (int): Size limit of the on-disk tier in bytes.
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_bytes=2 * 1024 ** 3):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        return (f"CoxFitCache(entries={len(self._memory)}, hits={self.hits}, "
+                f"disk_hits={self.disk_hits}, misses={self.misses})")
+
+    def key(self, data, features, duration_col, event_col, **options):
+        """
+        Builds the cache key of a fit: hashes of the used columns of `data`, the sorted feature list,
+        the duration and event columns and the fitter options.
+        """
+        features = sorted(features)
+        columns = features + [duration_col, event_col]
+        payload = {
+            'n': len(data),
+            'columns': {col: _column_hash(data[col]) for col in columns},
+            'features': features,
+            'duration_col': duration_col,
+            'event_col': event_col,
+            # 0 and 0.0 must give the same key
+            'options': {name: repr(float(value) if isinstance(value, int) and not isinstance(value, bool) else value)
+                        for name, value in sorted(options.items())},
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """
+        Returns the model stored under `key`, or None, updating the hit/miss counters.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as file:
+                    model = pickle.load(file)
+                os.utime(path)  # mark as recently used for eviction
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                model = None
+            if model is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, model)
+                return model
+
+        self.misses += 1
+        return None
+
+    def put(self, key, model):
+        """
+        Stores `model` under `key` in memory and, if enabled, on disk.
+        """
+        self._remember(key, model)
+        if self.cache_dir is not None:
+            # Write to a temporary file first so concurrent readers never see partial pickles
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+
+    def _remember(self, key, model):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = model
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """
+        Deletes the least recently used pickles until the disk tier fits in `max_disk_bytes`.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the number of models held in memory.
+        """
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'memory_entries': len(self._memory)}
+
+    def clear(self, disk=False):
+        """
+        Empties the memory tier (and the disk tier if `disk` is True) and resets the counters.
+        """
+        self._memory.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        if disk and self.cache_dir is not None:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+def cached_fit(fit, data, features, duration_col, event_col, **options):
+    """
+    Returns the model for this (data, features, options) from the installed cache, calling `fit()`
+    and storing its result on a miss. Without an installed cache this is just `fit()`.
+
+    Parameters:
+        fit (callable): Fits and returns the model when it is not cached.
+        data (pd.DataFrame): The data the model is fitted on.
+        features (list): The covariates of the model.
+        duration_col (str): Column name for the duration until the event.
+        event_col (str): Column name for the event indicator.
+        **options: Fitter options that change the result, e.g. `penalizer`.
+
+    Returns:
+        The fitted (or cached) model.
+    """
+    cache = get_fit_cache()
+    if cache is None:
+        return fit()
+
+    key = cache.key(data, features, duration_col, event_col, **options)
+    model = cache.get(key)
+    if model is None:
+        model = fit()
+        cache.put(key, model)
+    return model
@@ -1,14 +1,79 @@
+import hashlib
+
+import numpy as np
 import pandas as pd
 import seaborn as sns
-from scipy import stats
+from scipy import signal, stats
 import matplotlib.pyplot as plt
 
 from statannot import add_stat_annotation
 
 
+# Binned KDEs by (grs_col, group, bandwidth, content hash of the values, grid)
+_KDE_CACHE = {}
+
+
+def group_labels(data, disease_col, uveitis_col, disease_label):
+    """
+    Labels every row with its group (Controls / disease only / Uve / disease-Uve) without copying
+    the data.
+
+    Parameters:
+    data (pd.DataFrame): The DataFrame containing patient data.
+    disease_col (str): The column name for binary disease.
+    uveitis_col (str): The column name for binary uveitis.
+    disease_label (str): A human-readable label for the disease.
+
+    Returns:
+    pd.Categorical: The group of every row, with the groups in the order of `define_groups`.
+    """
+    disease = (data[disease_col] == 1).to_numpy()
+    uveitis = (data[uveitis_col] == 1).to_numpy()
+    codes = disease.astype(np.int8) + 2 * uveitis.astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=['Controls', f'{disease_label} only', 'Uve',
+                                                        f'{disease_label}-Uve'])
+
+
+def group_indices(groups):
+    """
+    Integer row positions of every group.
+
+    Parameters:
+    groups (pd.Categorical): Groups from `group_labels`.
+
+    Returns:
+    dict: Group name -> np.ndarray of row positions.
+    """
+    codes = np.asarray(groups.codes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(groups.categories) + 1))
+    return {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(groups.categories)}
+
+
+def group_values(data, grs_col, groups):
+    """
+    The values of one column split by group, without materialising sub-DataFrames.
+
+    Returns:
+    dict: Group name -> np.ndarray of the group's `grs_col` values.
+    """
+    values = data[grs_col].to_numpy()
+    return {label: values[idx] for label, idx in group_indices(groups).items()}
+
+
+def grs_by_group(groups, grs_col):
+    """
+    The `grs_col` values of every group, for groups given either as DataFrames (`define_groups`)
+    or as arrays of values (`group_values`).
+    """
+    return {label: group[grs_col].to_numpy() if isinstance(group, pd.DataFrame) else group
+            for label, group in groups.items()}
+
+
 def define_groups(data, disease_col, uveitis_col, disease_label):
     """
     Defines groups based on the presence of a disease and uveitis.
+    Prefer `group_labels` and `group_values`, which do not copy the data.
 
     Parameters:
     data (pd.DataFrame): The DataFrame containing patient data.
@@ -19,48 +84,127 @@ def define_groups(data, disease_col, uveitis_col, disease_label):
     Returns:
     dict: A dictionary containing DataFrames for each group.
     """
-    # Controls are cases without the disease and without uveitis
-    controls = data.loc[(data[disease_col] != 1) & (data[uveitis_col] != 1)]
+    groups = group_labels(data, disease_col, uveitis_col, disease_label)
+    return {label: data.iloc[idx] for label, idx in group_indices(groups).items()}
 
-    # Disease only are cases with the disease but without uveitis
-    disease_only = data.loc[(data[disease_col] == 1) & (data[uveitis_col] != 1)]
 
-    # Uveitis only are cases without the disease but with uveitis
-    uve_only = data.loc[(data[disease_col] != 1) & (data[uveitis_col] == 1)]
+def kde_bandwidth(values, bandwidth='scott'):
+    """
+    Gaussian kernel bandwidth of `values`: Scott's or Silverman's rule as in `scipy.stats.gaussian_kde`
+    (and so `sns.kdeplot`), or a fixed number.
+    """
+    if not isinstance(bandwidth, str):
+        return float(bandwidth)
+    n = len(values)
+    if bandwidth == 'scott':
+        factor = n ** (-1 / 5)
+    elif bandwidth == 'silverman':
+        factor = (n * 3 / 4) ** (-1 / 5)
+    else:
+        raise ValueError(f"bandwidth must be 'scott', 'silverman' or a number, got {bandwidth!r}")
+    return float(np.std(values, ddof=1) * factor)
+
+
+def binned_kde(values, grid, bandwidth):
+    """
+    Gaussian KDE of `values` on an evenly spaced `grid`: the values are linearly binned onto the grid
+    and the counts are convolved with the kernel by FFT, in O(n + grid log grid) instead of
+    O(n x grid).
+
+    Parameters:
+    values (np.ndarray): The sample.
+    grid (np.ndarray): Evenly spaced evaluation points covering the sample.
+    bandwidth (float): Kernel standard deviation.
+
+    Returns:
+    np.ndarray: The density at every grid point.
+    """
+    step = grid[1] - grid[0]
+    position = np.clip((values - grid[0]) / step, 0, len(grid) - 1)
+    left = np.minimum(position.astype(int), len(grid) - 2)
+    right_weight = position - left
+    counts = (np.bincount(left, weights=1 - right_weight, minlength=len(grid))
+              + np.bincount(left + 1, weights=right_weight, minlength=len(grid)))
+
+    reach = min(int(np.ceil(4 * bandwidth / step)), len(grid) - 1)
+    offsets = np.arange(-reach, reach + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    return np.clip(signal.fftconvolve(counts, kernel, mode='same'), 0, None) / len(values)
 
-    # Disease-Uve are cases with both the disease and uveitis
-    disease_uve = data.loc[(data[disease_col] == 1) & (data[uveitis_col] == 1)]
 
-    return {
-        'Controls': controls,
-        f'{disease_label} only': disease_only,
-        'Uve': uve_only,
-        f'{disease_label}-Uve': disease_uve
-    }
+def group_densities(groups, grs_col, bandwidth='scott', gridsize=512, cut=3):
+    """
+    Density of every group on a grid shared by all groups, from `binned_kde`. Densities are cached by
+    (grs_col, group, bandwidth), the content of the group's values and the grid, so panels drawn
+    again (e.g. in another layout) are not recomputed.
 
+    Parameters:
+    groups (dict): Group name -> values (`group_values`) or DataFrame (`define_groups`).
+    grs_col (str): Column name of the genetic risk scores.
+    bandwidth (str or float): 'scott', 'silverman' or a fixed bandwidth.
+    gridsize (int): Number of grid points.
+    cut (float): Bandwidths the grid extends beyond the data, as in `sns.kdeplot`.
 
-def plot_distributions(ax, groups, grs_col, colors, disease_name):
+    Returns:
+    np.ndarray, dict: The grid, and group name -> (density, (low, high) support of the group).
+        Groups with fewer than two values or a zero bandwidth (all values equal) are left out.
+    """
+    # Missing scores are dropped, as sns.kdeplot does
+    groups = {label: np.asarray(values, dtype=float) for label, values in grs_by_group(groups, grs_col).items()}
+    groups = {label: values[~np.isnan(values)] for label, values in groups.items()}
+    groups = {label: values for label, values in groups.items() if len(values) > 1}
+    bandwidths = {label: kde_bandwidth(values, bandwidth) for label, values in groups.items()}
+    # Constant groups have a zero bandwidth and no density, like groups with fewer than two values
+    groups = {label: values for label, values in groups.items() if bandwidths[label] > 0}
+    if not groups:
+        return np.array([]), {}
+    low = min(values.min() - cut * bandwidths[label] for label, values in groups.items())
+    high = max(values.max() + cut * bandwidths[label] for label, values in groups.items())
+    grid = np.linspace(low, high, gridsize)
+
+    densities = {}
+    for label, values in groups.items():
+        key = (grs_col, label, bandwidths[label], hashlib.sha1(values.tobytes()).hexdigest(),
+               low, high, gridsize)
+        if key not in _KDE_CACHE:
+            _KDE_CACHE[key] = binned_kde(values, grid, bandwidths[label])
+        support = (values.min() - cut * bandwidths[label], values.max() + cut * bandwidths[label])
+        densities[label] = (_KDE_CACHE[key], support)
+    return grid, densities
+
+
+def plot_distributions(ax, groups, grs_col, colors, disease_name, bandwidth='scott'):
     """
     Plots Kernel Density Estimation (KDE) for each group on the given axis using specified colors.
 
     Parameters:
     ax (matplotlib.axes.Axes): The axes object to plot the distributions.
-    groups (dict): Dictionary of groups with their respective data.
+    groups (dict): Dictionary of groups with their respective data (`define_groups`) or values (`group_values`).
     grs_col (str): Column name of the genetic risk scores.
     colors (dict): Dictionary mapping group names to colors for the plot.
     disease_name (str): The name of the disease derived from the column name.
+    bandwidth (str or float): KDE bandwidth rule or value, see `kde_bandwidth`.
     """
+    grid, densities = group_densities(groups, grs_col, bandwidth)
     for group_name, group_data in groups.items():
         
         label = f"{group_name}, n={len(group_data):,}"
-        sns.kdeplot(group_data[grs_col], ax=ax, color=colors[group_name], label=label)
+        if group_name not in densities:
+            # Fewer than two values, or a single repeated value, have no density
+            continue
+        density, (low, high) = densities[group_name]
+        within = (grid >= low) & (grid <= high)
+        ax.plot(grid[within], density[within], color=colors[group_name], label=label)
+    ax.set_xlabel(grs_col)
+    ax.set_ylabel('Density')
 
 
 def perform_tests(groups, grs_col, comparisons):
+    values = grs_by_group(groups, grs_col)
     p_values = []
     for group1, group2 in comparisons:
-        result = stats.ttest_ind(groups[group1][grs_col],
-                                 groups[group2][grs_col],
+        result = stats.ttest_ind(values[group1],
+                                 values[group2],
                                  equal_var=False)
         p_values.append(result.pvalue)
     return p_values
@@ -136,7 +280,7 @@ def plot_grs(data, disease_col, grs_col, uveitis_col, ax, colors=None,
             f'{disease_name}-Uve': 'purple'
         }
 
-    groups = define_groups(data, disease_col, uveitis_col, disease_name)
+    groups = group_values(data, grs_col, group_labels(data, disease_col, uveitis_col, disease_name))
     plot_distributions(ax, groups, grs_col, colors, disease_name)
     ax.set_title(f'Distribution of {disease_name} GRS')
     ax.set_xlim(None, 8)
@@ -156,15 +300,58 @@ def plot_grs(data, disease_col, grs_col, uveitis_col, ax, colors=None,
     
     
 
+def create_multiple_condition_subplots(data, pairs, uveitis_col, save_label='unnamed.svg',
+                                       figsize=(9, 18), n_rows=4, n_cols=2):
+    """
+    Create subplots for genetic risk score distributions for multiple disease conditions.
+
+    Parameters:
+    data (pd.DataFrame): The dataset containing the data.
+    pairs (list of tuples): List of tuples, where each tuple contains the disease column name and the GRS column name.
+    uveitis_col (str): The uveitis status column in the data.
+    save_label (str): Filename under which to save the figure.
+    figsize (tuple): Figure size.
+    n_rows, n_cols (int): Layout of the panels.
+    """
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=figsize, squeeze=False)
+    
+    # Loop over the conditions and their respective GRS columns
+    for idx, (disease_col, grs_col) in enumerate(pairs):
+        ax = axes[idx // n_cols, idx % n_cols]  # Determine the position of the current subplot
+        disease_name = disease_col.replace("_any", "")
+
+        # Define colors for plotting
+        colors = {
+            'Controls': 'gray',
+            f'{disease_name} only': 'green',
+            'Uve': 'blue',
+            f'{disease_name}-Uve': 'orangered'
+        }
+
+        # Plot genetic risk scores distribution
+        plot_grs(data, disease_col, grs_col, uveitis_col, ax, colors=colors)
+
+        # Set title for each subplot
+        ax.set_title(f'{disease_name}-GRS Distribution')
+        ax.set_xlabel(f'{disease_col.replace("_any", "-GRS")}')
+        
+        if idx == 0 or (idx//n_cols)==0:
+            ax.set_ylabel('Density')
+        else:
+            ax.set_ylabel('')
+
+    # Enhance layout and display the plot
+    plt.tight_layout(pad=1)
+    plt.savefig(save_label)
+    plt.show()
+
+
 def plot_violin(data, disease_col, grs_col, uveitis_col, ax, colors=None,
                 alpha_values=None,fontsize=10):
     disease_name = disease_col.replace('_any', '')
-    groups = define_groups(data, disease_col, uveitis_col, disease_name)
-    group_data = (pd.concat(groups.values(), keys=groups.keys())
-                  .reset_index(level=0)
-                  .rename(columns={'level_0': 'Group'})
-                 )
-    group_data.rename(columns={group_data.columns[1]: grs_col}, inplace=True)
+    # One label column next to the scores instead of concatenated copies of every group
+    group_data = pd.DataFrame({'Group': group_labels(data, disease_col, uveitis_col, disease_name),
+                               grs_col: data[grs_col].to_numpy()})
     
     print(group_data.Group.value_counts())
 
@@ -0,0 +1,196 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Version of the on-disk layout written by `CoxModelArtifact.save`
+ARTIFACT_VERSION = 1
+
+
+class CoxModelArtifact:
+    """
+    Compact, lifelines-free representation of a fitted Cox model: the coefficients, the training
+    means used to centre the covariates, the baseline cumulative hazard and the fit metadata.
+
+    Artifacts are stored as a single uncompressed .npz file (no pickles), so they load in
+    milliseconds and do not depend on the lifelines version the model was fitted with.
+    Predictions follow `CoxPHFitter`: the partial hazard is exp((x - mean) @ coef) and the baseline
+    cumulative hazard is linearly interpolated at the requested times.
+
+    Parameters:
+        features (list): Covariate names, in coefficient order.
+        coef (np.ndarray): Coefficients on the original covariate scale.
+        norm_mean (np.ndarray): Training means of the covariates.
+        baseline_times (np.ndarray): Increasing times of the baseline cumulative hazard.
+        baseline_cumulative_hazard (np.ndarray): Baseline cumulative hazard at `baseline_times`.
+        metadata (dict, optional): JSON-serialisable fit metadata (columns, penalizer, sample size, ...).
+    """
+
+    def __init__(self, features, coef, norm_mean, baseline_times, baseline_cumulative_hazard, metadata=None):
+        self.features = list(features)
+        self.coef = np.asarray(coef, dtype=float)
+        self.norm_mean = np.asarray(norm_mean, dtype=float)
+        self.baseline_times = np.asarray(baseline_times, dtype=float)
+        self.baseline_cumulative_hazard = np.asarray(baseline_cumulative_hazard, dtype=float)
+        self.metadata = dict(metadata or {})
+
+        if not (len(self.features) == len(self.coef) == len(self.norm_mean)):
+            raise ValueError("features, coef and norm_mean must have the same length.")
+        if self.baseline_times.shape != self.baseline_cumulative_hazard.shape:
+            raise ValueError("baseline_times and baseline_cumulative_hazard must have the same shape.")
+        if np.any(np.diff(self.baseline_times) < 0):
+            raise ValueError("baseline_times must be increasing.")
+
+    def __repr__(self):
+        name = self.metadata.get('name')
+        label = f"'{name}', " if name else ''
+        return f"CoxModelArtifact({label}features={self.features})"
+
+    @classmethod
+    def from_fitter(cls, cph, **metadata):
+        """
+        Builds an artifact from a fitted, unstratified `CoxPHFitter`.
+
+        Parameters:
+            cph (CoxPHFitter): The fitted model.
+            **metadata: Extra JSON-serialisable metadata to store, e.g. disease=..., grs=...
+
+        Returns:
+            CoxModelArtifact: The artifact.
+        """
+        if getattr(cph, 'strata', None):
+            raise ValueError("Stratified models cannot be converted to a CoxModelArtifact.")
+
+        baseline = cph.baseline_cumulative_hazard_.iloc[:, 0]
+        info = {
+            'duration_col': cph.duration_col,
+            'event_col': cph.event_col,
+            'penalizer': float(np.mean(cph.penalizer)),
+            'l1_ratio': float(cph.l1_ratio),
+            'n_obs': int(cph._n_examples),
+            'n_events': int(np.sum(cph.event_observed)),
+            'log_likelihood': float(cph.log_likelihood_),
+            'AIC_partial': float(cph.AIC_partial_),
+            'concordance_index': float(cph.concordance_index_),
+            'se': cph.standard_errors_.astype(float).tolist(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        try:
+            from importlib.metadata import version
+            info['lifelines_version'] = version('lifelines')
+        except Exception:
+            pass
+        info.update(metadata)
+
+        return cls(cph.params_.index, cph.params_.values, cph._norm_mean.reindex(cph.params_.index).values,
+                   baseline.index.values, baseline.values, metadata=info)
+
+    def save(self, path):
+        """
+        Writes the artifact to `path` (a .npz file).
+
+        Parameters:
+            path (str): Destination file; numpy appends '.npz' if missing.
+        """
+        np.savez(path,
+                 format_version=np.array(ARTIFACT_VERSION),
+                 features=np.array(self.features, dtype=str),
+                 coef=self.coef,
+                 norm_mean=self.norm_mean,
+                 baseline_times=self.baseline_times,
+                 baseline_cumulative_hazard=self.baseline_cumulative_hazard,
+                 metadata=np.array(json.dumps(self.metadata)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an artifact written by `save`.
+
+        Parameters:
+            path (str): The .npz file.
+
+        Returns:
+            CoxModelArtifact: The artifact.
+        """
+        with np.load(path, allow_pickle=False) as stored:
+            version = int(stored['format_version'])
+            if version > ARTIFACT_VERSION:
+                raise ValueError(f"{path} uses artifact format {version}; this version reads up to "
+                                 f"{ARTIFACT_VERSION}.")
+            return cls(stored['features'].tolist(), stored['coef'], stored['norm_mean'],
+                       stored['baseline_times'], stored['baseline_cumulative_hazard'],
+                       metadata=json.loads(str(stored['metadata'])))
+
+    @property
+    def params_(self):
+        """
+        Coefficients as a Series indexed by covariate, as on `CoxPHFitter`.
+        """
+        return pd.Series(self.coef, index=pd.Index(self.features, name='covariate'), name='coef')
+
+    def _design(self, X):
+        if isinstance(X, pd.DataFrame):
+            return X[self.features].to_numpy(dtype=float), X.index
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return X, pd.RangeIndex(len(X))
+
+    def predict_log_partial_hazard(self, X):
+        """
+        Returns (x - mean) @ coef for every row of `X` (a DataFrame with the model's features, or an
+        array with the columns in `features` order).
+        """
+        X, index = self._design(X)
+        return pd.Series((X - self.norm_mean) @ self.coef, index=index)
+
+    def predict_partial_hazard(self, X):
+        """
+        Returns exp((x - mean) @ coef) for every row of `X`.
+        """
+        return np.exp(self.predict_log_partial_hazard(X))
+
+    def baseline_cumulative_hazard_at(self, times):
+        """
+        Baseline cumulative hazard linearly interpolated at `times`.
+        """
+        return np.interp(np.atleast_1d(times).astype(float), self.baseline_times,
+                         self.baseline_cumulative_hazard)
+
+    def predict_survival_at(self, X, times):
+        """
+        Survival probabilities of every row of `X` at `times`.
+
+        Parameters:
+            X (pd.DataFrame or np.ndarray): Covariates of the individuals.
+            times (float or array-like): Times to evaluate the survival function at.
+
+        Returns:
+            pd.DataFrame: Survival probabilities indexed by time with one column per individual,
+            the layout of `CoxPHFitter.predict_survival_function`.
+        """
+        times = np.atleast_1d(times).astype(float)
+        X, index = self._design(X)
+        partial_hazard = np.exp((X - self.norm_mean) @ self.coef)
+        cumulative_hazard = np.outer(self.baseline_cumulative_hazard_at(times), partial_hazard)
+        return pd.DataFrame(np.exp(-cumulative_hazard), index=times, columns=index)
+
+    def predict_survival_function(self, X, times=None):
+        """
+        `CoxPHFitter`-compatible alias of `predict_survival_at`, evaluated at the baseline times if
+        `times` is None, so an artifact can be passed wherever a fitted model is expected for scoring.
+        """
+        return self.predict_survival_at(X, self.baseline_times if times is None else times)
+
+
+def load_model_artifact(path):
+    """
+    Loads a model artifact saved by `prepare_and_save_model(..., save_format='artifact')`.
+
+    Parameters:
+        path (str): The .npz file.
+
+    Returns:
+        CoxModelArtifact: The artifact.
+    """
+    return CoxModelArtifact.load(path)
@@ -1,10 +1,20 @@
 import datetime
+import glob
+import json
 import os
+import warnings
+from contextlib import redirect_stdout
 from lifelines import CoxPHFitter
 
+import numpy as np
 import pandas as pd
 
 from survival_analysis.backward_elimination import * 
+from survival_analysis.fit_cache import cache_settings, cached_fit, install_worker_cache, set_fit_cache
+from survival_analysis.model_artifact import CoxModelArtifact
+from survival_analysis.ph_test import proportional_hazard_tests
+from survival_analysis.regularization_path import penalized_path_selection
+from survival_analysis.shared_cohort import resolve_n_jobs, shared_pool, worker_frame
 from datetime import datetime
 
 import pickle
@@ -14,7 +24,7 @@ def fit_and_show_cph(data, disease, grs, uve_col='uve_any',
                      add_columns=['Sex_Female'], duration_col=None,
                      event_col=None, save_summary=True,
                      save_dir = None, return_model=True,
-                     get_dummies = None):
+                     get_dummies = None, results_store=None):
     """
     Fit and display a summary of a Cox Proportional Hazards model using the provided data.
     Optionally, saves the summary to an Excel file.
@@ -29,11 +39,70 @@ def fit_and_show_cph(data, disease, grs, uve_col='uve_any',
     duration_col (str, optional): Duration from uveitis diagnosis to the event. Defaults if None.
     event_col (str, optional): Event indicator column name. Defaults if None.
     save_summary (bool, optional): Flag to save the summary to an Excel file.
+    results_store (ResultsStore, optional): Store the summary is appended to.
 
     Returns:
     None: The function prints and optionally saves the fit summary of the Cox model.
     """
     
+    if add_columns is None:
+        add_columns = []
+
+    # Strip '_any' from the disease name to handle its normal form
+    disease_name = disease.strip('_any')
+
+    # Define columns to export from the dataset
+    cols_to_export = [grs, event_col, duration_col, age_col] + add_columns
+
+    cph_data, duration_col, event_col = build_cph_frame(data, disease, grs, uve_col, age_col, add_columns,
+                                                        duration_col, event_col, get_dummies)
+
+    # Fit the Cox Proportional Hazards model (or reuse it from the installed fit cache) and print the summary
+    features = [col for col in cph_data.columns if col not in [duration_col, event_col]]
+    cph = cached_fit(lambda: CoxPHFitter().fit(cph_data, duration_col=duration_col, event_col=event_col),
+                     cph_data, features, duration_col, event_col, penalizer=0.0, backend='lifelines')
+    cph.print_summary()
+    
+    # formatting filename of the saved xlsx file
+    age_type = 'cont' if age_col=='age_uve_years' else age_col
+    num_vars = len(cols_to_export)-2
+
+    # Semiformatted file name
+    semi_name = f"{disease_name}_{num_vars}_{age_type}"
+
+    if results_store is not None:
+        results_store.append(cph, disease=disease_name, grs=grs, label=semi_name)
+
+    if save_summary:
+        if save_dir is not None:
+            save_cph_summary(cph, save_name=semi_name, directory=save_dir)
+        else:
+            save_cph_summary(cph, save_name=semi_name)
+    
+    if return_model:
+        return cph, cph_data
+
+        
+def build_cph_frame(data, disease, grs, uve_col='uve_any', age_col='age_uve_years', add_columns=None,
+                    duration_col=None, event_col=None, get_dummies=None):
+    """
+    Builds the model frame fitted by `fit_and_show_cph`: the filtered data from `prepare_cph_data`,
+    with `get_dummies` one-hot encoded (dropping its most frequent level and levels without events).
+
+    Parameters:
+    data (pd.DataFrame): The dataset containing the patient data.
+    disease (str): The base name of the disease column, appended with '_any'.
+    grs (str): Column name for the genetic risk score.
+    uve_col (str, optional): Column name indicating uveitis status. Defaults to 'uve_any'.
+    age_col (str, optional): Column name for age at uveitis diagnosis. Defaults to 'age_uve_years'.
+    add_columns (list, optional): Additional patient attributes to include.
+    duration_col (str, optional): Duration from uveitis diagnosis to the event. Defaults if None.
+    event_col (str, optional): Event indicator column name. Defaults if None.
+    get_dummies (str, optional): Categorical column to one-hot encode.
+
+    Returns:
+    tuple: The model frame and the resolved duration and event column names.
+    """
     if add_columns is None:
         add_columns = []
 
@@ -72,29 +141,10 @@ def fit_and_show_cph(data, disease, grs, uve_col='uve_any',
         cph_data.drop(columns=[i for i in cph_data.columns
                                if i.strip(f"{get_dummies}_") in vals.astype(str)],
                       inplace=True)
-                  
-    # Fit the Cox Proportional Hazards model and print the summary
-    cph = CoxPHFitter()
-    cph.fit(cph_data, duration_col=duration_col, event_col=event_col)
-    cph.print_summary()
-    
-    
-    if save_summary:
-        # formatting filename of the saved xlsx file
-        age_type = 'cont' if age_col=='age_uve_years' else age_col
-        num_vars = len(cols_to_export)-2
-        
-        # Semiformatted file name
-        semi_name = f"{disease_name}_{num_vars}_{age_type}"
-        if save_dir is not None:
-            save_cph_summary(cph, save_name=semi_name, directory=save_dir)
-        else:
-            save_cph_summary(cph, save_name=semi_name)
-    
-    if return_model:
-        return cph, cph_data
 
-        
+    return cph_data, duration_col, event_col
+
+
 def prepare_cph_data(data, disease, grs, uve_col='uve_any',
                      age_col='age_uve_years', add_columns=None, 
                      duration_col=None, event_col=None):
@@ -156,7 +206,7 @@ def save_cph_summary(cph_model, save_name,
         os.makedirs(directory)
 
     # Format today's date as YYYYMMDD
-    today = datetime.date.today().strftime('%d%m%Y')
+    today = datetime.now().strftime('%d%m%Y')
 
     # Create filename with today's date and the disease name
     filename = f"{save_name}_CPH_summary_{today}.xlsx"
@@ -171,7 +221,8 @@ def save_cph_summary(cph_model, save_name,
 def prepare_and_save_model(data, disease, grs, event_col, duration_col,
                            age_col, add_columns, save_path, return_model=True,
                            return_data=True,
-                           trace=False, penalizer = 0):
+                           trace=False, penalizer = 0, backend='lifelines', save_format='pickle',
+                           results_store=None, selection='elimination'):
     """
     Prepare data, perform backward elimination, check model assumptions, and save the model with a date and disease name in the filename.
 
@@ -184,6 +235,13 @@ def prepare_and_save_model(data, disease, grs, event_col, duration_col,
         age_col (str): Age column name.
         add_columns (list): List of additional columns to include.
         save_path (str): Path to save the finalized model.
+        backend (str): Cox backend used for the elimination fits, 'lifelines' or 'numpy'
+            (see `backward_elimination_AIC`).
+        save_format (str): 'pickle' to pickle the full CoxPHFitter, or 'artifact' to save a compact
+            `CoxModelArtifact` (.npz) that loads without lifelines (see `load_model_artifact`).
+        results_store (ResultsStore, optional): Store the final model's summary is appended to.
+        selection (str): 'elimination' for `two_stage_elimination`, or 'path' for the cross-validated
+            lasso path of `penalized_path_selection`.
 
     Returns:
         None: Saves the model to the specified path and prints the path.
@@ -192,27 +250,22 @@ def prepare_and_save_model(data, disease, grs, event_col, duration_col,
     preped_df = prepare_cph_data(data, disease=disease, grs=grs, event_col=event_col,
                                  duration_col=duration_col, age_col=age_col, add_columns=add_columns)
 
-    # Perform backward elimination based on p-values
-    features, cph = backward_elimination_p(preped_df,
-                                           duration_col=duration_col,
-                                           event_col=event_col,
-                                           penalizer=penalizer)
-    
-    print(f'Backward elimination based on P-value completed.'
-          +f'Features reminaing: {features} \n')
-    
-    
-    # Perform backward elimination based on partial AIC
-    
-    features, cph = backward_elimination_AIC(preped_df[features 
-                                                       + [duration_col, event_col]],
-                                             duration_col=duration_col,
-                                             event_col=event_col)
+    if selection == 'elimination':
+        features, cph = two_stage_elimination(preped_df, duration_col, event_col,
+                                              penalizer=penalizer, backend=backend)
+    elif selection == 'path':
+        features, cph, _, _ = penalized_path_selection(preped_df, duration_col=duration_col,
+                                                       event_col=event_col)
+        if cph is None:
+            raise ValueError(f"The regularization path selected no features for {disease}.")
+    else:
+        raise ValueError(f"selection must be 'elimination' or 'path', got {selection!r}")
 
     # Check model assumptions
-    assumption_check = cph.check_assumptions(preped_df[features 
-                                                       + [duration_col, event_col]],
-                                             p_value_threshold=0.05)
+    assumption_check = proportional_hazard_tests(cph, preped_df[features + [duration_col, event_col]])
+    violations = assumption_check.loc[assumption_check['p'] < 0.05, 'covariate'].unique()
+    if len(violations):
+        print(f"Proportional hazards assumption rejected (p < 0.05) for: {', '.join(violations)}")
     if trace:
         print("Assumption Check Results:", assumption_check, '\n')
 
@@ -220,10 +273,18 @@ def prepare_and_save_model(data, disease, grs, event_col, duration_col,
     current_date = datetime.now().strftime("%Y-%m-%d")
 
     # Save the model
-    filename = f'{save_path}/{disease}_finalised_model_{current_date}.pkl'
-    with open(filename, 'wb') as file:
-        pickle.dump(cph, file)
+    if save_format == 'artifact':
+        filename = f'{save_path}/{disease}_finalised_model_{current_date}.npz'
+        CoxModelArtifact.from_fitter(cph, name=disease, grs=grs).save(filename)
+    elif save_format == 'pickle':
+        filename = f'{save_path}/{disease}_finalised_model_{current_date}.pkl'
+        with open(filename, 'wb') as file:
+            pickle.dump(cph, file)
+    else:
+        raise ValueError(f"save_format must be 'pickle' or 'artifact', got {save_format!r}")
     print(f"Model saved to {filename}")
+    if results_store is not None:
+        results_store.append(cph, disease=disease, grs=grs, label='finalised_model')
     
     if return_model and not return_data:
         return cph
@@ -232,4 +293,306 @@ def prepare_and_save_model(data, disease, grs, event_col, duration_col,
     
     elif return_data:
         preped_df[features + [duration_col, event_col]]
-    
\ No newline at end of file
+
+
+def two_stage_elimination(preped_df, duration_col, event_col, penalizer=0, backend='lifelines'):
+    """
+    Runs backward elimination on p-values followed by backward elimination on partial AIC,
+    the feature selection used by `prepare_and_save_model`.
+
+    Parameters:
+        preped_df (pd.DataFrame): Data prepared by `prepare_cph_data`.
+        duration_col (str): Duration column name.
+        event_col (str): Event column name.
+        penalizer (float): Penalizer of the p-value elimination fits.
+        backend (str): Cox backend used for the elimination fits, 'lifelines' or 'numpy'.
+
+    Returns:
+        list, CoxPHFitter: The selected features and the final model.
+    """
+    # Perform backward elimination based on p-values
+    features, cph = backward_elimination_p(preped_df,
+                                           duration_col=duration_col,
+                                           event_col=event_col,
+                                           penalizer=penalizer,
+                                           backend=backend)
+    
+    print(f'Backward elimination based on P-value completed.'
+          +f'Features reminaing: {features} \n')
+    
+    
+    # Perform backward elimination based on partial AIC
+    
+    features, cph = backward_elimination_AIC(preped_df[features 
+                                                       + [duration_col, event_col]],
+                                             duration_col=duration_col,
+                                             event_col=event_col,
+                                             backend=backend)
+    return features, cph
+
+
+def _stability_replicate(data, replicate, seed, sample, subsample_fraction, duration_col, event_col,
+                         penalizer, backend):
+    """
+    Runs the two-stage elimination on one bootstrap or subsample replicate of `data`.
+
+    Returns:
+        dict: The replicate number, the selected features and their hazard ratios, or the error raised.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    if sample == 'bootstrap':
+        rows = rng.integers(0, n, n)
+    else:
+        rows = np.sort(rng.choice(n, int(round(subsample_fraction * n)), replace=False))
+    replicate_df = data.iloc[rows].reset_index(drop=True)
+
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            features, cph = two_stage_elimination(replicate_df, duration_col, event_col,
+                                                  penalizer=penalizer, backend=backend)
+    except Exception as error:  # a failed replicate is recorded, not fatal
+        return {'replicate': replicate, 'features': None, 'hazard_ratios': None, 'error': repr(error)}
+
+    return {'replicate': replicate, 'features': list(features),
+            'hazard_ratios': {feature: float(hr) for feature, hr in cph.hazard_ratios_.items()},
+            'error': None}
+
+
+def _stability_replicate_task(*args):
+    """
+    Worker task: runs `_stability_replicate` on the shared cohort without touching the fit cache,
+    since every replicate's data is unique.
+    """
+    set_fit_cache(None)
+    return _stability_replicate(worker_frame(), *args)
+
+
+def stability_selection(data, disease, grs, event_col, duration_col, age_col, add_columns,
+                        n_replicates=500, sample='bootstrap', subsample_fraction=0.5, seed=0,
+                        n_jobs=1, checkpoint_dir=None, penalizer=0, backend='lifelines'):
+    """
+    Estimates how stable the features selected by `prepare_and_save_model` are, by rerunning the
+    two-stage (p-value then AIC) backward elimination on bootstrap or subsample replicates.
+
+    Replicate b always uses the b-th child of `np.random.SeedSequence(seed)`, so results do not depend
+    on `n_jobs` or on the order replicates finish in. With `checkpoint_dir`, every finished replicate is
+    written to its own JSON file and a rerun with the same settings skips the replicates already there.
+
+    Parameters:
+        data (pd.DataFrame): Input dataset.
+        disease (str): Disease name for the data preparation.
+        grs (str): Genetic Risk Score column name.
+        event_col (str): Event column name.
+        duration_col (str): Duration column name.
+        age_col (str): Age column name.
+        add_columns (list): List of additional columns to include.
+        n_replicates (int): Number of replicates B.
+        sample (str): 'bootstrap' (n rows with replacement) or 'subsample' (without replacement).
+        subsample_fraction (float): Share of rows drawn per replicate when `sample` is 'subsample'.
+        seed (int): Seed of the replicate seed sequence.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        checkpoint_dir (str, optional): Directory for per-replicate results, enabling resumption.
+        penalizer (float): Penalizer of the p-value elimination fits.
+        backend (str): Cox backend used for the elimination fits, 'lifelines' or 'numpy'.
+
+    Returns:
+        DataFrame, DataFrame: Per-feature selection frequencies with hazard ratio percentiles across the
+            replicates selecting the feature, and the hazard ratios of every replicate in long format.
+    """
+    if sample not in ('bootstrap', 'subsample'):
+        raise ValueError(f"Unknown sample {sample!r}; use 'bootstrap' or 'subsample'.")
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        preped_df = prepare_cph_data(data, disease=disease, grs=grs, event_col=event_col,
+                                     duration_col=duration_col, age_col=age_col, add_columns=add_columns)
+    candidate_features = [col for col in preped_df.columns if col not in [duration_col, event_col]]
+    seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+    settings = {'disease': disease, 'grs': grs, 'features': candidate_features, 'n_rows': len(preped_df),
+                'sample': sample, 'subsample_fraction': subsample_fraction, 'seed': seed,
+                'penalizer': penalizer, 'backend': backend}
+
+    results = {}
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        settings_path = os.path.join(checkpoint_dir, 'settings.json')
+        if os.path.exists(settings_path):
+            with open(settings_path) as file:
+                if json.load(file) != settings:
+                    raise ValueError(f"{checkpoint_dir} holds replicates of a run with different settings.")
+        else:
+            with open(settings_path, 'w') as file:
+                json.dump(settings, file, indent=2)
+        for path in glob.glob(os.path.join(checkpoint_dir, 'replicate_*.json')):
+            with open(path) as file:
+                result = json.load(file)
+            if result['replicate'] < n_replicates:
+                results[result['replicate']] = result
+        print(f"Resuming with {len(results)} of {n_replicates} replicates already completed")
+
+    def record(result):
+        results[result['replicate']] = result
+        if checkpoint_dir is not None:
+            path = os.path.join(checkpoint_dir, f"replicate_{result['replicate']:05d}.json")
+            with open(path + '.tmp', 'w') as file:
+                json.dump(result, file)
+            os.replace(path + '.tmp', path)
+
+    pending = [b for b in range(n_replicates) if b not in results]
+    task_args = [(b, seeds[b], sample, subsample_fraction, duration_col, event_col, penalizer, backend)
+                 for b in pending]
+    if resolve_n_jobs(n_jobs) > 1 and len(pending) > 1:
+        with shared_pool(preped_df, n_jobs) as executor:
+            # Results arrive in submission order; each is checkpointed as soon as it is returned
+            for done, result in enumerate(executor.map(_stability_replicate_task, *zip(*task_args)), 1):
+                record(result)
+                if done % 10 == 0:
+                    print(f"{done}/{len(pending)} replicates completed")
+    else:
+        # Every replicate's data is unique, so its fits would only evict useful cache entries
+        previous_cache = set_fit_cache(None)
+        try:
+            for args in task_args:
+                record(_stability_replicate(preped_df, *args))
+        finally:
+            set_fit_cache(previous_cache)
+
+    completed = [results[b] for b in sorted(results) if results[b]['error'] is None]
+    failed = len(results) - len(completed)
+    if failed:
+        print(f"{failed} replicates failed and are excluded from the frequencies")
+
+    hazard_ratios = pd.DataFrame([{'replicate': result['replicate'], 'feature': feature, 'hazard_ratio': hr}
+                                  for result in completed for feature, hr in result['hazard_ratios'].items()],
+                                 columns=['replicate', 'feature', 'hazard_ratio'])
+    grouped = hazard_ratios.groupby('feature')['hazard_ratio']
+    frequencies = pd.DataFrame({'n_selected': grouped.size()}).reindex(candidate_features, fill_value=0)
+    frequencies['selection_frequency'] = frequencies['n_selected'] / max(len(completed), 1)
+    frequencies['hr_median'] = grouped.median()
+    frequencies['hr_2.5%'] = grouped.quantile(0.025)
+    frequencies['hr_97.5%'] = grouped.quantile(0.975)
+    frequencies.index.name = 'feature'
+    return frequencies.sort_values('selection_frequency', ascending=False), hazard_ratios
+
+
+# Defaults of the optional keys of a grid job, as in fit_and_show_cph
+_GRID_DEFAULTS = {'uve_col': 'uve_any', 'age_col': 'age_uve_years', 'add_columns': ['Sex_Female'],
+                  'get_dummies': None, 'duration_col': None, 'event_col': None}
+
+
+def _fit_recording_convergence(cph_data, duration_col, event_col):
+    """
+    Fits a CoxPHFitter and stores the messages of its convergence warnings on the model as
+    `convergence_warnings_`, so that they are cached with it.
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        cph = CoxPHFitter().fit(cph_data, duration_col=duration_col, event_col=event_col)
+    cph.convergence_warnings_ = [str(w.message).strip() for w in caught if 'converge' in str(w.message).lower()]
+    return cph
+
+
+def _fit_grid_job(data, job):
+    """
+    Builds the model frame of one grid job and fits it, recording failures and non-convergence
+    instead of raising.
+
+    Returns:
+        dict: The job key, its status, error message, size, number of events, partial AIC and summary.
+    """
+    result = {'status': 'ok', 'error': None, 'n': None, 'n_events': None, 'AIC_partial': None, 'summary': None}
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            cph_data, duration_col, event_col = build_cph_frame(
+                data, job['disease'], job['grs'], job['uve_col'], job['age_col'], job['add_columns'],
+                job['duration_col'], job['event_col'], job['get_dummies'])
+        features = [col for col in cph_data.columns if col not in [duration_col, event_col]]
+        cph = cached_fit(lambda: _fit_recording_convergence(cph_data, duration_col, event_col),
+                         cph_data, features, duration_col, event_col, penalizer=0.0, backend='lifelines')
+        if not hasattr(cph, 'convergence_warnings_'):
+            # Cached by another caller without its convergence warnings: refit to recover them
+            cph = _fit_recording_convergence(cph_data, duration_col, event_col)
+    except Exception as error:  # a failed job is recorded, not fatal to the grid
+        result.update(status='failed', error=repr(error))
+        return result
+
+    if cph.convergence_warnings_:
+        result.update(status='not_converged', error=cph.convergence_warnings_[0])
+    result.update(n=len(cph_data), n_events=int(cph_data[event_col].sum()),
+                  AIC_partial=cph.AIC_partial_, summary=cph.summary)
+    return result
+
+
+def _fit_grid_job_task(job, cache_dir, max_disk_bytes):
+    """
+    Worker task: runs `_fit_grid_job` on the shared cohort.
+    """
+    install_worker_cache(cache_dir, max_disk_bytes)
+    return _fit_grid_job(worker_frame(), job)
+
+
+def run_cph_grid(data, spec, n_jobs=1, results_store=None):
+    """
+    Fits the Cox model of `fit_and_show_cph` for every job of a grid of (disease, grs, age_col,
+    add_columns, get_dummies) combinations and collects all summaries into one tidy table.
+
+    The cohort is projected to the columns the grid needs and, with `n_jobs` > 1, shared once with a
+    pool of worker processes. Jobs that fail or do not converge are recorded in the `status` and
+    `error` columns rather than aborting the grid. Nothing is printed per job and no Excel files are written.
+
+    Parameters:
+        data (pd.DataFrame): The dataset containing the patient data.
+        spec (list of dict or pd.DataFrame): One job per entry with keys 'disease' and 'grs' and optionally
+            'age_col', 'add_columns', 'get_dummies', 'uve_col', 'duration_col' and 'event_col'
+            (defaults as in `fit_and_show_cph`).
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        results_store (ResultsStore, optional): Store the summaries of the fitted jobs are appended to.
+
+    Returns:
+        pd.DataFrame: One row per (job, covariate) with the job key, status, n, events, partial AIC and
+            the summary columns; failed jobs have a single row without covariate.
+    """
+    if isinstance(spec, pd.DataFrame):
+        spec = spec.to_dict('records')
+    jobs = []
+    for entry in spec:
+        job = {**_GRID_DEFAULTS, **entry}
+        job['add_columns'] = list(job['add_columns'] or [])
+        jobs.append(job)
+
+    # Columns needed by any job, so only those are shared with the workers
+    needed = []
+    for job in jobs:
+        disease_name = job['disease'].strip('_any')
+        needed += [job['uve_col'], f"first_{disease_name}", job['grs'], job['age_col'],
+                   job['event_col'] or f'first_uve_{disease_name}',
+                   job['duration_col'] or f'uve_to_{disease_name}_years'] + job['add_columns']
+    cohort = data[[col for col in dict.fromkeys(needed) if col in data.columns]]
+
+    if resolve_n_jobs(n_jobs) > 1 and len(jobs) > 1:
+        cache_dir, max_disk_bytes = cache_settings()
+        with shared_pool(cohort, n_jobs) as executor:
+            results = list(executor.map(_fit_grid_job_task, jobs,
+                                        [cache_dir] * len(jobs), [max_disk_bytes] * len(jobs)))
+    else:
+        results = [_fit_grid_job(cohort, job) for job in jobs]
+
+    rows = []
+    for job, result in zip(jobs, results):
+        key = {'disease': job['disease'], 'grs': job['grs'], 'age_col': job['age_col'],
+               'add_columns': ', '.join(job['add_columns']), 'get_dummies': job['get_dummies'],
+               'status': result['status'], 'error': result['error'], 'n': result['n'],
+               'n_events': result['n_events'], 'AIC_partial': result['AIC_partial']}
+        if result['summary'] is None:
+            rows.append(key)
+        else:
+            rows += [{**key, **row} for row in result['summary'].reset_index().to_dict('records')]
+            if results_store is not None:
+                results_store.append_summary(result['summary'], disease=job['disease'].strip('_any'),
+                                             grs=job['grs'], label=f"grid_{job['age_col']}",
+                                             n=result['n'], n_events=result['n_events'],
+                                             AIC_partial=result['AIC_partial'])
+
+    failed = sum(result['status'] != 'ok' for result in results)
+    print(f"Fitted {len(jobs) - failed} of {len(jobs)} grid jobs; {failed} failed or did not converge")
+    return pd.DataFrame(rows)
@@ -0,0 +1,129 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from survival_analysis.cox_engine import RiskSetCox
+from survival_analysis.shared_cohort import resolve_n_jobs
+
+
+_TIME_TRANSFORMS = ('rank', 'km', 'identity', 'log')
+
+
+def _ph_statistics(data, features, params, variance, duration_col, event_col, time_transform):
+    """
+    Grambsch-Therneau score tests of the scaled Schoenfeld residuals against transformed event time,
+    for all covariates and time transforms at once.
+
+    Returns:
+        pd.DataFrame: One row per (covariate, time transform) with the chi-squared statistic and p-value.
+    """
+    engine = RiskSetCox(data[features + [duration_col, event_col]], duration_col, event_col)
+    n_deaths = engine.n_events
+    residuals = engine.schoenfeld_residuals(features, params)
+    # Scaled Schoenfeld residuals as in lifelines: d * r @ V
+    scaled = n_deaths * residuals @ variance
+    se2 = np.diag(variance)
+
+    death_times = engine.durations[engine.events]
+    transforms = {
+        'rank': np.arange(1, n_deaths + 1, dtype=float),
+        'km': 1 - engine.kaplan_meier_at_deaths() if 'km' in time_transform else None,
+        'identity': death_times,
+        'log': np.log(death_times) if 'log' in time_transform else None,
+    }
+    G = np.column_stack([transforms[name] for name in time_transform])
+    G = G - G.mean(0)
+
+    statistic = (G.T @ scaled) ** 2 / (n_deaths * se2[None, :] * (G ** 2).sum(0)[:, None])
+    p = stats.chi2.sf(statistic, 1)
+    return pd.DataFrame({
+        'covariate': np.tile(features, len(time_transform)),
+        'time_transform': np.repeat(time_transform, len(features)),
+        'test_statistic': statistic.ravel(),
+        'p': p.ravel(),
+    })
+
+
+def _model_terms(model):
+    features = list(model.params_.index)
+    variance = model.variance_matrix_.loc[features, features].to_numpy(dtype=float)
+    return features, model.params_.to_numpy(dtype=float), variance, model.duration_col, model.event_col
+
+
+def _ph_task(data, terms, time_transform):
+    return _ph_statistics(data, *terms, time_transform)
+
+
+def proportional_hazard_tests(model, data, time_transform=('rank', 'km')):
+    """
+    Metrics-only test of the proportional hazards assumption of a fitted Cox model: the same scaled
+    Schoenfeld residual test as lifelines' `proportional_hazard_test` / `check_assumptions`, computed
+    for every covariate and time transform in one vectorized pass, without plots or advice.
+
+    Parameters:
+        model (CoxPHFitter or CoxEngineResult): The fitted model.
+        data (pd.DataFrame): The data the model was fitted on.
+        time_transform (str or tuple, optional): Any of 'rank', 'km', 'identity' and 'log'.
+
+    Returns:
+        pd.DataFrame: One row per (covariate, time transform) with the test statistic (chi-squared,
+            1 df), p and -log2(p).
+    """
+    time_transform = _check_transforms(time_transform)
+    result = _ph_statistics(data, *_model_terms(model), time_transform)
+    with np.errstate(divide='ignore'):
+        result['-log2(p)'] = -np.log2(result['p'])
+    return result
+
+
+def _check_transforms(time_transform):
+    if isinstance(time_transform, str):
+        time_transform = (time_transform,)
+    unknown = set(time_transform) - set(_TIME_TRANSFORMS)
+    if unknown:
+        raise ValueError(f"Unknown time transform(s) {sorted(unknown)}; use any of {_TIME_TRANSFORMS}.")
+    return tuple(time_transform)
+
+
+def ph_test_batch(models, data, time_transform=('rank', 'km'), n_jobs=1):
+    """
+    Runs `proportional_hazard_tests` for a batch of fitted models, in parallel with `n_jobs` > 1,
+    and returns one tidy table, e.g. to check the PH assumption across a whole model grid.
+
+    Parameters:
+        models (dict or list): Fitted models, keyed by name (a list is keyed by position).
+        data (dict, list or pd.DataFrame): The training frame of each model, keyed or ordered like
+            `models`, or a single frame all models were fitted on.
+        time_transform (str or tuple, optional): Any of 'rank', 'km', 'identity' and 'log'.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+
+    Returns:
+        pd.DataFrame: One row per (model, covariate, time transform) with the test statistic, p and -log2(p).
+    """
+    time_transform = _check_transforms(time_transform)
+    if not isinstance(models, dict):
+        models = dict(enumerate(models))
+    if isinstance(data, pd.DataFrame):
+        frames = {name: data for name in models}
+    elif isinstance(data, dict):
+        frames = data
+    else:
+        frames = dict(zip(models, data))
+
+    names = list(models)
+    terms = [_model_terms(models[name]) for name in names]
+    # Only the columns each model uses are sent to the workers
+    projected = [frames[name][t[0] + [t[3], t[4]]] for name, t in zip(names, terms)]
+
+    if resolve_n_jobs(n_jobs) > 1 and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=resolve_n_jobs(n_jobs)) as executor:
+            results = list(executor.map(_ph_task, projected, terms, [time_transform] * len(names)))
+    else:
+        results = [_ph_task(frame, t, time_transform) for frame, t in zip(projected, terms)]
+
+    table = pd.concat([result.assign(model=name) for name, result in zip(names, results)], ignore_index=True)
+    with np.errstate(divide='ignore'):
+        table['-log2(p)'] = -np.log2(table['p'])
+    return table[['model', 'covariate', 'time_transform', 'test_statistic', 'p', '-log2(p)']]
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from lifelines import CoxPHFitter
+
+from survival_analysis.cox_engine import RiskSetCox
+from survival_analysis.evaluation import harrell_c, stratified_folds
+from survival_analysis.fit_cache import cached_fit
+from survival_analysis.shared_cohort import resolve_n_jobs, shared_pool, worker_frame
+
+
+def _path_fold(data, fold, test_fold, features, duration_col, event_col, penalizers, l1_ratio, scoring,
+               penalty_factor=None):
+    """
+    Fits the penalizer path without fold `test_fold` and scores every point of it on the held-out rows.
+
+    Returns:
+        np.ndarray: One score per penalizer.
+    """
+    columns = features + [duration_col, event_col]
+    train = data.loc[fold != test_fold, columns]
+    test = data.loc[fold == test_fold, columns]
+    train_engine = RiskSetCox(train, duration_col, event_col)
+    coefs, train_log_liks, _ = train_engine.fit_path(features, penalizers, l1_ratio=l1_ratio,
+                                                     penalty_factor=penalty_factor)
+
+    if scoring == 'partial_likelihood':
+        # Verweij & van Houwelingen cross-validated partial likelihood of the held-out fold
+        full_engine = RiskSetCox(data[columns], duration_col, event_col)
+        return np.array([full_engine.partial_log_likelihood(features, coef) for coef in coefs]) - train_log_liks
+
+    X = test[features].to_numpy(dtype=float)
+    return np.array([harrell_c(test[duration_col], test[event_col], X @ coef) for coef in coefs])
+
+
+def _path_fold_task(fold, test_fold, features, duration_col, event_col, penalizers, l1_ratio, scoring,
+                    penalty_factor):
+    """
+    Worker task: runs `_path_fold` on the shared cohort.
+    """
+    return _path_fold(worker_frame(), fold, test_fold, features, duration_col, event_col,
+                      penalizers, l1_ratio, scoring, penalty_factor)
+
+
+def penalized_path_selection(data, duration_col='uve_to_MS_years', event_col='first_uve_MS',
+                             penalizers=None, n_penalizers=30, min_ratio=0.01, l1_ratio=1.0,
+                             scoring='partial_likelihood', n_folds=5, rule='best', seed=0, n_jobs=1,
+                             refit_penalizer=0.0):
+    """
+    Selects features in a single pass by fitting elastic-net Cox models along a decreasing penalizer
+    grid, each warm-started from the previous solution, and picking the penalizer by cross-validation.
+    An alternative to repeated backward elimination for wide GRS + covariate models. As in the other
+    selectors, features containing 'age' or 'sex' are always retained: they are not penalized.
+
+    The grid defaults to `n_penalizers` log-spaced values from the smallest penalizer that removes
+    every penalized feature down to `min_ratio` times it. Penalizers have lifelines' scale. Folds are
+    stratified by event status and evaluated in parallel with `n_jobs` > 1.
+
+    Parameters:
+        data (pd.DataFrame): The dataset; every column other than duration and event is a candidate feature.
+        duration_col (str): Column name for the duration until the event.
+        event_col (str): Column name for the event indicator (1 if event occurred, 0 otherwise).
+        penalizers (array-like, optional): Penalizer grid; overrides `n_penalizers` and `min_ratio`.
+        n_penalizers (int): Number of grid points.
+        min_ratio (float): Smallest penalizer of the grid relative to the largest.
+        l1_ratio (float): Share of the penalty applied as L1 (1 for the lasso).
+        scoring (str): 'partial_likelihood' (cross-validated partial likelihood) or 'c_index' (Harrell's C).
+        n_folds (int): Number of cross-validation folds.
+        rule (str): 'best' for the best mean score or '1se' for the largest penalizer within one
+            standard error of it, which gives sparser models.
+        seed (int): Seed of the fold assignment.
+        n_jobs (int): Number of worker processes (-1 for all cores).
+        refit_penalizer (float): Penalizer of the final lifelines model fitted on the selected features.
+
+    Returns:
+        list, CoxPHFitter, pd.DataFrame, pd.DataFrame: The selected features, the final model (None if
+            no feature was selected), the coefficient path (one row per penalizer) and the
+            cross-validation table.
+    """
+    if scoring not in ('partial_likelihood', 'c_index'):
+        raise ValueError(f"scoring must be 'partial_likelihood' or 'c_index', got {scoring!r}")
+    if rule not in ('best', '1se'):
+        raise ValueError(f"rule must be 'best' or '1se', got {rule!r}")
+
+    features = [col for col in data.columns if col not in [duration_col, event_col]]
+    # Features that must always be retained (containing 'age' or 'sex') are left unpenalized
+    mandatory_features = [col for col in features if 'age' in col.lower() or 'sex' in col.lower()]
+    penalty_factor = np.array([0.0 if col in mandatory_features else 1.0 for col in features])
+    data = data[features + [duration_col, event_col]]
+    engine = RiskSetCox(data, duration_col, event_col)
+    if penalizers is None:
+        penalizers = (engine.max_penalizer(features, l1_ratio, penalty_factor)
+                      * np.geomspace(1, min_ratio, n_penalizers))
+    penalizers = np.sort(np.asarray(penalizers, dtype=float))[::-1]
+
+    coefs, _, _ = engine.fit_path(features, penalizers, l1_ratio=l1_ratio, penalty_factor=penalty_factor)
+    path = pd.DataFrame(coefs, index=pd.Index(penalizers, name='penalizer'), columns=features)
+
+    fold = stratified_folds(data[event_col], n_folds, seed)
+    args = (features, duration_col, event_col, penalizers, l1_ratio, scoring, penalty_factor)
+    if resolve_n_jobs(n_jobs) > 1:
+        with shared_pool(data, n_jobs) as executor:
+            scores = list(executor.map(_path_fold_task, [fold] * n_folds, range(n_folds),
+                                       *[[arg] * n_folds for arg in args]))
+    else:
+        scores = [_path_fold(data, fold, k, *args) for k in range(n_folds)]
+    scores = np.vstack(scores)
+
+    cv = pd.DataFrame({'penalizer': penalizers,
+                       'n_features': (coefs != 0).sum(1),
+                       'score_mean': scores.mean(0),
+                       'score_se': scores.std(0, ddof=1) / np.sqrt(n_folds)})
+    best = int(cv['score_mean'].idxmax())
+    if rule == '1se':
+        threshold = cv.loc[best, 'score_mean'] - cv.loc[best, 'score_se']
+        best = int(np.flatnonzero(cv['score_mean'] >= threshold)[0])
+    cv['selected'] = cv.index == best
+
+    selected = [col for col, coef in zip(features, coefs[best]) if coef != 0 or col in mandatory_features]
+    print(f"Selected penalizer {penalizers[best]:.4g} ({scoring}); features: {selected}")
+    if not selected:
+        return selected, None, path, cv
+
+    final_data = data[selected + [duration_col, event_col]]
+    cph = cached_fit(lambda: CoxPHFitter(penalizer=refit_penalizer).fit(final_data, duration_col=duration_col,
+                                                                        event_col=event_col),
+                     final_data, selected, duration_col, event_col, penalizer=refit_penalizer, backend='lifelines')
+    return selected, cph, path, cv
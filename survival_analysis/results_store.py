@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import uuid
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Model key columns, followed by one row per covariate of the model summary
+_KEY_COLUMNS = ['run_id', 'created', 'disease', 'grs', 'label', 'features', 'penalizer',
+                'n', 'n_events', 'AIC_partial', 'concordance_index']
+_SUMMARY_COLUMNS = ['covariate', 'coef', 'hr', 'se', 'coef_lower', 'coef_upper', 'hr_lower', 'hr_upper',
+                    'z', 'p', 'neg_log2_p']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT, created TEXT, disease TEXT, grs TEXT, label TEXT, features TEXT, penalizer REAL,
+    n INTEGER, n_events INTEGER, AIC_partial REAL, concordance_index REAL,
+    covariate TEXT, coef REAL, hr REAL, se REAL, coef_lower REAL, coef_upper REAL,
+    hr_lower REAL, hr_upper REAL, z REAL, p REAL, neg_log2_p REAL
+);
+CREATE INDEX IF NOT EXISTS results_grs ON results (grs, covariate);
+CREATE INDEX IF NOT EXISTS results_disease ON results (disease, covariate);
+"""
+
+
+def _tidy_summary(summary):
+    """
+    Renames the columns of a lifelines-style summary to the store's column names.
+    """
+    renamed = {}
+    for col in summary.columns:
+        if col == 'exp(coef)':
+            renamed[col] = 'hr'
+        elif col == 'se(coef)':
+            renamed[col] = 'se'
+        elif col == '-log2(p)':
+            renamed[col] = 'neg_log2_p'
+        elif col.startswith('coef lower'):
+            renamed[col] = 'coef_lower'
+        elif col.startswith('coef upper'):
+            renamed[col] = 'coef_upper'
+        elif col.startswith('exp(coef) lower'):
+            renamed[col] = 'hr_lower'
+        elif col.startswith('exp(coef) upper'):
+            renamed[col] = 'hr_upper'
+    tidy = summary.rename(columns=renamed).rename_axis('covariate').reset_index()
+    return tidy.reindex(columns=_SUMMARY_COLUMNS)
+
+
+class ResultsStore:
+    """
+    Append-only SQLite store of fitted Cox model summaries, one row per (model, covariate), replacing
+    the per-model Excel files of `save_cph_summary`. Every row carries the model key (disease, grs,
+    label, features, penalizer, n, events, fit time) next to the summary columns, so results of many
+    fits can be compared with a single query and exported to Excel on demand.
+
+    SQLite handles concurrent appends from several processes, so pool workers may share a store.
+
+    Parameters:
+        path (str): Database file, created if it does not exist.
+    """
+
+    def __init__(self, path='cph_results.sqlite'):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def __repr__(self):
+        return f"ResultsStore('{self.path}')"
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a connection that commits (or rolls back) and is closed at the end of the block;
+        sqlite3's own context manager commits but leaves the connection open.
+        """
+        with closing(sqlite3.connect(self.path, timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def append_summary(self, summary, disease=None, grs=None, label=None, penalizer=0.0, n=None,
+                       n_events=None, AIC_partial=None, concordance_index=None):
+        """
+        Appends a lifelines-style summary table under the given model key.
+
+        Returns:
+            str: The run id of the appended model.
+        """
+        run_id = uuid.uuid4().hex
+        rows = _tidy_summary(summary)
+        key = {'run_id': run_id, 'created': datetime.now().isoformat(timespec='seconds'),
+               'disease': disease, 'grs': grs, 'label': label, 'features': ', '.join(rows['covariate']),
+               'penalizer': float(np.mean(penalizer)), 'n': n, 'n_events': n_events,
+               'AIC_partial': AIC_partial, 'concordance_index': concordance_index}
+        rows = rows.assign(**key)[_KEY_COLUMNS + _SUMMARY_COLUMNS]
+        with self._connect() as conn:
+            rows.to_sql('results', conn, if_exists='append', index=False)
+        return run_id
+
+    def append(self, model, disease=None, grs=None, label=None):
+        """
+        Appends the summary of a fitted model (`CoxPHFitter` or `CoxEngineResult`).
+
+        Parameters:
+            model: The fitted model.
+            disease (str, optional): Disease the model was fitted for.
+            grs (str, optional): Genetic risk score used in the model.
+            label (str, optional): Free-text label, e.g. the name `save_cph_summary` would have used.
+
+        Returns:
+            str: The run id of the appended model.
+        """
+        n = getattr(model, '_n_examples', getattr(model, 'n_obs', None))
+        if hasattr(model, 'event_observed'):
+            n_events = int(np.sum(model.event_observed))
+        else:
+            n_events = getattr(model, 'n_events', None)
+        concordance = getattr(model, 'concordance_index_', None)
+        return self.append_summary(model.summary, disease=disease, grs=grs, label=label,
+                                   penalizer=getattr(model, 'penalizer', 0.0),
+                                   n=None if n is None else int(n),
+                                   n_events=None if n_events is None else int(n_events),
+                                   AIC_partial=float(model.AIC_partial_),
+                                   concordance_index=None if concordance is None else float(concordance))
+
+    def query(self, disease=None, grs=None, covariate=None, label=None, run_id=None, latest=False):
+        """
+        Returns the stored rows matching all given filters; each filter is a value or a list of values.
+        For example, all hazard ratios of MS_GRS across diseases: `store.query(grs='MS_GRS', covariate='MS_GRS')`.
+
+        Parameters:
+            disease, grs, covariate, label, run_id (str or list, optional): Filters on these columns.
+            latest (bool, optional): Keep only the most recent run of each (disease, grs, label, features) model.
+
+        Returns:
+            pd.DataFrame: The matching rows, oldest first.
+        """
+        clauses, params = [], []
+        for col, value in [('disease', disease), ('grs', grs), ('covariate', covariate),
+                           ('label', label), ('run_id', run_id)]:
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{col} IN ({', '.join('?' * len(values))})")
+            params += values
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._connect() as conn:
+            # rowid keeps insertion order for runs created within the same second
+            results = pd.read_sql_query(f"SELECT * FROM results {where} ORDER BY rowid", conn, params=params)
+
+        if latest and len(results):
+            model_key = results[['disease', 'grs', 'label', 'features']].fillna('')
+            last_run = results.groupby([model_key[col] for col in model_key])['run_id'].transform('last')
+            results = results[results['run_id'] == last_run].reset_index(drop=True)
+        return results
+
+    def runs(self):
+        """
+        Returns one row per stored model with its key columns.
+        """
+        with self._connect() as conn:
+            return pd.read_sql_query(f"SELECT {', '.join(_KEY_COLUMNS)} FROM results "
+                                     f"GROUP BY run_id ORDER BY MIN(rowid)", conn)
+
+    def export_excel(self, file_path, sheet_by=None, decimals=4, **filters):
+        """
+        Writes the rows matching `filters` (see `query`) to an Excel file, e.g. for the paper tables.
+
+        Parameters:
+            file_path (str): Destination .xlsx file.
+            sheet_by (str, optional): Column whose values get a sheet each, e.g. 'disease'; one sheet if None.
+            decimals (int, optional): Rounding of the numeric columns.
+            **filters: Passed to `query`.
+
+        Returns:
+            pd.DataFrame: The exported rows.
+        """
+        results = self.query(**filters)
+        with pd.ExcelWriter(file_path) as writer:
+            if sheet_by is None:
+                results.round(decimals).to_excel(writer, sheet_name='results', index=False)
+            else:
+                for value, group in results.groupby(sheet_by, dropna=False):
+                    group.round(decimals).to_excel(writer, sheet_name=str(value)[:31], index=False)
+        print(f"Exported {len(results)} rows to {file_path}")
+        return results
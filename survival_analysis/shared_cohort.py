@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+# DataFrame attached by the pool initializer in each worker process
+_WORKER_FRAME = None
+
+
+def resolve_n_jobs(n_jobs):
+    """
+    Translates an sklearn-style n_jobs value into a number of worker processes.
+
+    Parameters:
+        n_jobs (int or None): 1 or None for serial execution, -1 for all cores, -2 for all but one, etc.
+
+    Returns:
+        int: The number of worker processes to use (at least 1).
+    """
+    if n_jobs is None:
+        return 1
+    cpus = os.cpu_count() or 1
+    if n_jobs < 0:
+        return max(1, cpus + 1 + n_jobs)
+    return max(1, int(n_jobs))
+
+
+def is_categorical_like(dtype):
+    """
+    True for object, pandas string and categorical dtypes, the columns stored as codes.
+    """
+    return dtype == 'O' or isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+@contextmanager
+def share_frame(data):
+    """
+    Writes a cohort DataFrame once into a memory-mapped float64 array so that worker processes
+    can read it without the frame being pickled for every task.
+
+    Numeric and boolean columns are stored as float64; boolean and integer columns get their
+    original dtype back when a worker attaches. Object and categorical columns are stored as
+    integer codes and restored to their original dtype as well.
+
+    Parameters:
+        data (pd.DataFrame): The cohort to share.
+
+    Yields:
+        dict: A small, picklable handle describing the memory-mapped array.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='shared_cohort_')
+    path = os.path.join(tmp_dir, 'cohort.dat')
+    try:
+        categories = {}
+        dtypes = {}
+        values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=data.shape)
+        for j, col in enumerate(data.columns):
+            series = data[col]
+            if is_categorical_like(series.dtype):
+                codes, uniques = pd.factorize(series, sort=True)
+                values[:, j] = np.where(codes < 0, np.nan, codes)
+                categories[col] = uniques
+            else:
+                values[:, j] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            dtypes[col] = series.dtype
+        values.flush()
+        del values
+
+        yield {'path': path, 'columns': list(data.columns), 'index': data.index,
+               'categories': categories, 'dtypes': dtypes}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def attach_frame(handle):
+    """
+    Rebuilds a DataFrame from a handle produced by `share_frame`. The numeric columns are views of
+    the memory map, so attaching does not copy the cohort into the worker's memory.
+
+    Parameters:
+        handle (dict): The handle yielded by `share_frame`.
+
+    Returns:
+        pd.DataFrame: The shared cohort.
+    """
+    # Copy-on-write mapping: pages stay shared between workers unless a worker writes to them
+    values = np.load(handle['path'], mmap_mode='c')
+    columns = handle['columns']
+    categories = handle['categories']
+
+    # One block viewing the whole memory map; only the restored columns get their own arrays
+    frame = pd.DataFrame(values, index=handle['index'], columns=columns, copy=False)
+
+    for j, col in enumerate(columns):
+        if col in categories:
+            codes = np.nan_to_num(values[:, j], nan=-1).astype(np.int64)
+            restored = pd.Categorical.from_codes(codes, categories=categories[col])
+            frame[col] = pd.Series(restored, index=frame.index).astype(handle['dtypes'][col])
+        elif handle['dtypes'][col] == bool:
+            frame[col] = frame[col].astype(bool)
+        elif pd.api.types.is_integer_dtype(handle['dtypes'][col]) and not frame[col].isna().any():
+            # Integer columns keep their dtype so that e.g. dummy names match the parent frame's
+            frame[col] = frame[col].astype(handle['dtypes'][col])
+
+    return frame
+
+
+def _init_worker(handle):
+    global _WORKER_FRAME
+    _WORKER_FRAME = attach_frame(handle)
+
+
+def worker_frame():
+    """
+    Returns the cohort attached in the current worker process by `shared_pool`.
+    """
+    if _WORKER_FRAME is None:
+        raise RuntimeError("No shared cohort is attached to this process; use shared_pool().")
+    return _WORKER_FRAME
+
+
+@contextmanager
+def shared_pool(data, n_jobs):
+    """
+    Opens a process pool whose workers attach to a single shared copy of `data`.
+    Tasks submitted to the pool should read the cohort with `worker_frame()`.
+
+    Parameters:
+        data (pd.DataFrame): The cohort to share with the workers.
+        n_jobs (int): Number of worker processes (see `resolve_n_jobs`).
+
+    Yields:
+        ProcessPoolExecutor: The executor with the cohort attached in every worker.
+    """
+    with share_frame(data) as handle:
+        with ProcessPoolExecutor(max_workers=resolve_n_jobs(n_jobs),
+                                 initializer=_init_worker,
+                                 initargs=(handle,)) as executor:
+            yield executor
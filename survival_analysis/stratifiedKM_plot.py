@@ -1,7 +1,4 @@
 from lifelines import CoxPHFitter
-from lifelines import KaplanMeierFitter
-from lifelines.plotting import add_at_risk_counts
-from lifelines.statistics import logrank_test
 import pandas as pd
 import os
 import matplotlib.pyplot as plt 
@@ -10,6 +7,10 @@ import numpy as np
 
 from statannot import add_stat_annotation
 from sklearn import metrics
+from scipy import stats
+
+from survival_analysis.evaluation import cumulative_dynamic_auc, cumulative_dynamic_auc_bootstrap
+from survival_analysis.utilities_mod import time_list
 
 
 
@@ -22,84 +23,417 @@ cut_off_two_one_one ={0:.5, .5:.75, .75:1}
 
 
 
-def stratify_kmf(data, cut_off_dict={0:.25, .25:.5, .5:.75, .75:1}):
+# Labels of the predefined cut-off dictionaries, as used in the published plots
+_CUT_OFF_LABELS = {
+    tuple(cut_off_quarts.items()): ["1st qrt", "2nd qrt", "3rd qrt", '4th qrt'],
+    tuple(cut_off_threequarts.items()): ["1st quart", "2nd-3rd quart", "4th quart"],
+    tuple(cut_off_tertiles.items()): ["1st tertile", "2nd tertile", "3rd tertile"],
+    tuple(cut_off_two_one_one.items()): ["1st & 2nd quart.", "3rd quart.", '4th quart.'],
+}
+
+_QUANTILE_NAMES = {2: 'half', 3: 'tertile', 4: 'quartile', 5: 'quintile', 10: 'decile', 20: 'ventile'}
+
+
+def _ordinal(i):
+    suffix = 'th' if 10 <= i % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(i % 10, 'th')
+    return f"{i}{suffix}"
+
+
+def _quantile_bands(cut_points):
+    """
+    Normalises a cut-point specification into a list of (lower, upper) quantile bands: a number of
+    equal-sized groups (e.g. 10), a list of quantile edges (e.g. [0, .5, .9, 1]), or a
+    {lower: upper} dictionary such as `cut_off_quarts`.
+    """
+    if isinstance(cut_points, dict):
+        bands = list(cut_points.items())
+    elif np.isscalar(cut_points):
+        edges = np.linspace(0, 1, int(cut_points) + 1)
+        bands = list(zip(edges[:-1], edges[1:]))
+    else:
+        edges = list(cut_points)
+        bands = list(zip(edges[:-1], edges[1:]))
+    return sorted(bands)
+
+
+def quantile_labels(cut_points):
+    """
+    Auto-generated labels of the strata of a cut-point specification (see `quantile_strata`).
+    The predefined cut-off dictionaries keep their published labels; equal-sized groups are named
+    by rank (e.g. '3rd decile'); other bands by their percentile range (e.g. '90-100%').
+    """
+    if isinstance(cut_points, dict) and tuple(cut_points.items()) in _CUT_OFF_LABELS:
+        return list(_CUT_OFF_LABELS[tuple(cut_points.items())])
+    bands = _quantile_bands(cut_points)
+    widths = np.diff(np.array(bands), axis=1).ravel()
+    contiguous = all(np.isclose(bands[i][1], bands[i + 1][0]) for i in range(len(bands) - 1))
+    if contiguous and np.allclose(widths, widths[0]) and len(bands) in _QUANTILE_NAMES:
+        return [f"{_ordinal(i + 1)} {_QUANTILE_NAMES[len(bands)]}" for i in range(len(bands))]
+    return [f"{lower * 100:g}-{upper * 100:g}%" for lower, upper in bands]
+
+
+def quantile_strata(values, cut_points=cut_off_quarts, labels=None):
+    """
+    Assigns every row to a quantile stratum of `values` (e.g. `data.cph_prediction`) in one vectorized
+    pass: all quantile edges come from a single `np.quantile` call and rows are placed with
+    `searchsorted`. As in `stratify_kmf`, a stratum covers (lower, upper] quantiles, and the first
+    stratum also includes its lower edge when that is the minimum.
+
+    Parameters:
+        values (pd.Series or array-like): The values to stratify on.
+        cut_points (int, list or dict): Number of equal-sized groups, list of quantile edges, or a
+            {lower: upper} dictionary such as `cut_off_quarts`.
+        labels (list, optional): Stratum labels; generated by `quantile_labels` if None.
+
+    Returns:
+        pd.Categorical: Ordered stratum of every row; NaN for rows outside every band.
+    """
+    bands = _quantile_bands(cut_points)
+    labels = quantile_labels(cut_points) if labels is None else list(labels)
+    if len(labels) != len(bands):
+        raise ValueError(f"Got {len(labels)} labels for {len(bands)} strata.")
+
+    values = np.asarray(values, dtype=float)
+    lower_q, upper_q = np.array(bands).T
+    edges = np.quantile(values[~np.isnan(values)], np.r_[lower_q, upper_q])
+    lower, upper = edges[:len(bands)], edges[len(bands):]
+
+    codes = np.searchsorted(upper, values, side='left')
+    inside = codes < len(bands)
+    k = np.minimum(codes, len(bands) - 1)
+    inside &= (values > lower[k]) | ((lower_q[k] == 0) & (values >= lower[k]))
+    codes = np.where(inside, codes, -1)
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+def stratum_indices(strata):
+    """
+    Integer row positions of every stratum, for indexing without copying the frame.
+
+    Parameters:
+        strata (pd.Categorical): Strata from `quantile_strata`.
+
+    Returns:
+        dict: Stratum label -> np.ndarray of row positions.
+    """
+    codes = np.asarray(strata.codes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(strata.categories) + 1))
+    return {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(strata.categories)}
+
+
+def stratify_kmf(data, cut_off_dict={0:.25, .25:.5, .5:.75, .75:1}, column='cph_prediction'):
     """
     Stratifies the data_frame based on specified cut-off points using the Cox predicted hazard values.
+    Prefer `quantile_strata` and `stratum_indices`, which do not copy the data.
     
     Args:
         data (DataFrame): The DataFrame containing the data to be stratified.
-        cut_off_dict (dict): A dictionary with cut-off points for stratification.
+        cut_off_dict (dict): A dictionary with cut-off points for stratification, or any cut-point
+            specification accepted by `quantile_strata`.
+        column (str): The column to stratify on.
         
     Returns:
         list: A list of stratified groups based on the cut-off points.
     """
-    vars_list = []  # Initialize an empty list to store stratified groups
-    
-    for cut_off in cut_off_dict:
-        if cut_off == 0:
-            # For cut_off == 0, include values between the lower and upper quantiles
-            var = data[((data.cph_prediction >= data.cph_prediction.quantile(q=cut_off)) &
-                        (data.cph_prediction <= data.cph_prediction.quantile(q=cut_off_dict.get(cut_off))))]
-        elif cut_off > 0:
-            # For cut_off > 0, include values between the lower quantile (exclusive) and upper quantile
-            var = data[((data.cph_prediction > data.cph_prediction.quantile(q=cut_off)) &
-                        (data.cph_prediction <= data.cph_prediction.quantile(q=cut_off_dict.get(cut_off))))]
-        vars_list.append(var)  # Add the stratified group to the list
-        
-    return vars_list  # Return the list of stratified groups
+    strata = quantile_strata(data[column], cut_off_dict)
+    return [data.iloc[idx] for idx in stratum_indices(strata).values()]
+
+
+def _stratum_codes(strata, n):
+    """
+    Integer codes and labels of a stratum assignment: a Categorical, any array of labels, or None
+    for a single stratum. Rows with missing strata get code -1.
+    """
+    if strata is None:
+        return np.zeros(n, dtype=np.int64), ['all']
+    strata = pd.Categorical(strata)
+    return np.asarray(strata.codes, dtype=np.int64), list(strata.categories)
+
+
+def _exponential_greenwood(survival, greenwood, z):
+    """
+    Exponential Greenwood confidence bounds of Kaplan-Meier estimates, as in lifelines.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = np.log(survival)
+        lower = np.exp(-np.exp(np.log(-v) - z * np.sqrt(greenwood) / v))
+        upper = np.exp(-np.exp(np.log(-v) + z * np.sqrt(greenwood) / v))
+    return np.where(np.isnan(lower), 1.0, lower), np.where(np.isnan(upper), 1.0, upper)
+
+
+def _logrank(at_risk, deaths, labels):
+    """
+    Multivariate log-rank test across all strata and the pairwise tests of every two strata, from
+    the (time x stratum) at-risk and death counts.
+
+    Returns:
+        pd.Series, pd.DataFrame: The overall test and one row per pair of strata.
+    """
+    total_at_risk = at_risk.sum(1)
+    total_deaths = deaths.sum(1)
+    rows = (total_deaths > 0) & (total_at_risk > 0)
+    at_risk, deaths = at_risk[rows], deaths[rows]
+    n, d = total_at_risk[rows][:, None], total_deaths[rows][:, None]
+
+    observed = deaths.sum(0)
+    expected = (d * at_risk / n).sum(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(n > 1, d * (n - d) / (n - 1), 0.0)
+    share = at_risk / n
+    # Hypergeometric covariance of the death counts, summed over event times
+    covariance = np.diag((scale * share).sum(0)) - (scale * share).T @ share
+
+    present = np.flatnonzero(at_risk.sum(0) > 0) if len(at_risk) else np.array([], dtype=int)
+    kept = present[:-1]
+    difference = (observed - expected)[kept]
+    if len(kept):
+        statistic = float(difference @ np.linalg.solve(covariance[np.ix_(kept, kept)], difference))
+    else:
+        statistic = np.nan
+    overall = pd.Series({'test_statistic': statistic, 'df': len(kept),
+                         'p': stats.chi2.sf(statistic, len(kept)) if len(kept) else np.nan})
+
+    first, second = np.triu_indices(len(labels), 1)
+    n_pair = at_risk[:, first] + at_risk[:, second]
+    d_pair = deaths[:, first] + deaths[:, second]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_first = np.where(n_pair > 0, d_pair * at_risk[:, first] / n_pair, 0.0).sum(0)
+        variance = np.where(n_pair > 1, d_pair * (n_pair - d_pair) / (n_pair - 1)
+                            * at_risk[:, first] * at_risk[:, second] / n_pair ** 2, 0.0).sum(0)
+        statistic = (deaths[:, first].sum(0) - expected_first) ** 2 / variance
+    pairwise = pd.DataFrame({'stratum_a': np.asarray(labels, dtype=object)[first],
+                             'stratum_b': np.asarray(labels, dtype=object)[second],
+                             'test_statistic': statistic,
+                             'p': stats.chi2.sf(statistic, 1)})
+    return overall, pairwise
+
+
+def stratified_km(data, duration_col, event_col, strata=None, alpha=0.05):
+    """
+    Kaplan-Meier curves, Greenwood variances, at-risk counts and log-rank tests of every stratum from
+    a single sort of the cohort, instead of one `KaplanMeierFitter` and one `logrank_test` per
+    stratum. All arrays are indexed by (distinct time of the cohort, stratum).
+
+    Parameters:
+        data (pd.DataFrame): The full cohort.
+        duration_col (str): Duration column name.
+        event_col (str): Event column name.
+        strata (str, array-like or None): Column name or per-row stratum labels (e.g. from
+            `quantile_strata`); the whole cohort is one stratum if None.
+        alpha (float): 1 - confidence level of the survival bounds.
+
+    Returns:
+        dict: 'labels', 'n' (rows per stratum), 'times', the (time x stratum) arrays 'at_risk',
+            'deaths', 'censored', 'survival', 'greenwood', 'lower' and 'upper', and the log-rank
+            tests 'logrank' (all strata) and 'pairwise' (every pair of strata).
+    """
+    if isinstance(strata, str):
+        strata = data[strata]
+    codes, labels = _stratum_codes(strata, len(data))
+    keep = codes >= 0
+    durations = data[duration_col].to_numpy(dtype=float)[keep]
+    events = data[event_col].to_numpy(dtype=float)[keep]
+    codes = codes[keep]
+    n_strata = len(labels)
+
+    times, time_rank = np.unique(durations, return_inverse=True)
+    cell = time_rank * n_strata + codes
+    removed = np.bincount(cell, minlength=len(times) * n_strata).reshape(len(times), n_strata)
+    deaths = np.bincount(cell, weights=events, minlength=len(times) * n_strata).reshape(len(times), n_strata)
+    at_risk = removed[::-1].cumsum(0)[::-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_terms = np.where(at_risk > 0, np.log1p(-deaths / at_risk), 0.0)
+        greenwood = np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0.0).cumsum(0)
+    survival = np.exp(log_terms.cumsum(0))
+    lower, upper = _exponential_greenwood(survival, greenwood, stats.norm.ppf(1 - alpha / 2))
+    logrank, pairwise = _logrank(at_risk, deaths, labels)
+
+    return {'labels': labels, 'n': removed.sum(0), 'times': times, 'at_risk': at_risk, 'deaths': deaths,
+            'censored': removed - deaths, 'survival': survival, 'greenwood': greenwood,
+            'lower': lower, 'upper': upper, 'logrank': logrank, 'pairwise': pairwise}
+
+
+def _km_lookup(km, times):
+    """
+    Row of the (time x stratum) arrays in effect at each of `times`; -1 before the first time.
+    """
+    return np.searchsorted(km['times'], np.asarray(times, dtype=float), 'right') - 1
+
+
+def km_at_risk_counts(km, times):
+    """
+    Number at risk just after, and censored and events up to, each time for every stratum, counted
+    as in lifelines' `add_at_risk_counts`.
+
+    Parameters:
+        km (dict): Output of `stratified_km`.
+        times (array-like): Times, e.g. the x ticks of a plot.
+
+    Returns:
+        pd.DataFrame: Rows (stratum, 'At risk' / 'Censored' / 'Events'), one column per time.
+    """
+    idx = _km_lookup(km, times)
+    started = (idx >= 0)[:, None]
+    cumulative_removed = np.vstack([np.zeros(len(km['labels'])), (km['deaths'] + km['censored']).cumsum(0)])
+    counts = {
+        'At risk': km['n'][None, :] - cumulative_removed[idx + 1],
+        'Censored': np.where(started, np.vstack([np.zeros(len(km['labels'])), km['censored'].cumsum(0)])[idx + 1], 0),
+        'Events': np.where(started, np.vstack([np.zeros(len(km['labels'])), km['deaths'].cumsum(0)])[idx + 1], 0),
+    }
+    index = pd.MultiIndex.from_product([km['labels'], list(counts)], names=['stratum', 'row'])
+    table = np.stack([counts[row].T for row in counts], axis=1).reshape(len(index), -1)
+    return pd.DataFrame(table.astype(int), index=index, columns=list(times))
+
+
+def _add_at_risk_table(ax, km, strata, labels, fontsize=5, ypos=-0.6):
+    """
+    Draws the at-risk table of `strata` under `ax` at its x ticks, laid out like lifelines'
+    `add_at_risk_counts`.
+    """
+    fig = ax.figure
+    ax2 = ax.twiny()
+    ax_height = (ax.get_position().y1 - ax.get_position().y0) * fig.get_figheight()
+    ax2.spines['bottom'].set_position(('axes', ypos / ax_height))
+    for side in ['top', 'right', 'bottom', 'left']:
+        ax2.spines[side].set_visible(False)
+    ax2.xaxis.tick_bottom()
+    min_time, max_time = ax.get_xlim()
+    ax2.set_xlim(min_time, max_time)
+    ticks = [tick for tick in ax.get_xticks() if min_time <= tick <= max_time]
+    ax2.set_xticks(ticks)
+    ax2.xaxis.set_ticks_position('none')
+    ax2.yaxis.set_ticks_position('none')
+
+    rows = ['At risk', 'Censored', 'Events']
+    table = km_at_risk_counts(km, ticks)
+    ticklabels = []
+    for i, tick in enumerate(ticks):
+        counts = [table.loc[(km['labels'][k], row)].iloc[i] for k in strata for row in rows]
+        if i == 0:
+            width = len(str(max(counts)))
+            lbl = ''
+            for j, c in enumerate(counts):
+                if j % len(rows) == 0:
+                    lbl += ('\n' if j > 0 else '') + labels[j // len(rows)] + '\n'
+                lbl += rows[j % len(rows)].rjust(10) + ' ' * (width - len(str(c)) + 3) + f'{c:>{width}d}\n'
+        else:
+            lbl = ''
+            for j, c in enumerate(counts):
+                if j % len(rows) == 0 and j > 0:
+                    lbl += '\n\n'
+                lbl += f'\n{c}'
+        ticklabels.append(lbl)
+    ax2.set_xticklabels(ticklabels, ha='right', fontsize=fontsize)
+    return ax2
+
+
+def _plot_binned_censors(ax, km, k, edges, style, color, rasterize):
+    """
+    Draws the censorings of stratum `k` aggregated into the bins `edges`: a marker per bin at the
+    mean censoring time, sized by its count ('bins'), or a density strip along the x axis ('rug').
+    """
+    censored = km['censored'][:, k]
+    times = km['times']
+    counts, _ = np.histogram(times, bins=edges, weights=censored)
+    if style == 'rug':
+        # Bar heights up to 3% of the axes, in axes coordinates
+        heights = 0.03 * counts / max(counts.max(), 1)
+        ax.stairs(heights, edges, fill=True, color=color, alpha=0.5, linewidth=0,
+                  transform=ax.get_xaxis_transform(), rasterized=rasterize)
+        return
+    sums, _ = np.histogram(times, bins=edges, weights=censored * times)
+    filled = counts > 0
+    mean_times = sums[filled] / counts[filled]
+    rows = np.searchsorted(times, mean_times, 'right') - 1
+    sizes = 0.5 + 3.5 * np.sqrt(counts[filled] / counts.max())
+    ax.scatter(mean_times, km['survival'][rows, k], s=sizes ** 2, marker='o', color=color,
+               linewidths=0, rasterized=rasterize)
 
 
 def plot_km(data, time, event, cut_off_dict={0:.25, .25:.5, .5:.75, .75:1},
             xlim =[0.0, 35.0],ylim=[0,1],
             save_label='Unnamed', plot_label='', figsize=[6, 6],
-            colours=colours, ci_show = True, alpha=0.01):
+            colours=colours, ci_show = True, alpha=0.01, labels=None, column='cph_prediction',
+            large_n=False, censor_style=None, censor_bins=100, rasterize=None):
     """
     Plots Kaplan-Meier survival curves based on the stratified data using specified cut-off points.
+    The curves, at-risk counts and log-rank tests come from one `stratified_km` pass over the cohort.
+
+    With `large_n` the size and save time of the figure depend on the number of distinct event times
+    and censoring bins rather than participants: the curves keep only their event-time vertices,
+    censorings are aggregated into `censor_bins` bins and the CI bands and censor layer are
+    rasterized inside the otherwise vector SVG.
     
     Args:
         data (DataFrame): The DataFrame containing the data to be plotted.
-        cut_off_dict (dict): A dictionary with cut-off points for stratification.
+        cut_off_dict (dict): A dictionary with cut-off points for stratification, or any cut-point
+            specification accepted by `quantile_strata` (e.g. 10 for deciles or [0, .9, 1]).
         save_label (str): A label for saving the plot.
         plot_label (str): A label for the plot title.
         figsize (list): A list specifying the dimensions of the plot.
-        colours (list): A list of colors for different groups.
+        colours (list): A list of colors for different groups; extended from a colormap if too short.
+        labels (list, optional): Stratum labels; generated by `quantile_labels` if None.
+        column (str): The column to stratify on.
+        large_n (bool): Render for large cohorts (see above).
+        censor_style (str, optional): 'markers' (one per distinct censoring time), 'bins' (one marker
+            per bin, sized by its count), 'rug' (censoring density along the x axis) or 'none';
+            'markers' by default, 'bins' with `large_n`.
+        censor_bins (int): Number of censoring bins across the x limits.
+        rasterize (bool, optional): Rasterize the CI bands and censor layer; defaults to `large_n`.
         
     Returns:
-        None
+        dict: The `stratified_km` output, including the log-rank tests.
     """
     
     # Stratify the data based on the cut-off points
-    stratified_data = stratify_kmf(data, cut_off_dict)
+    strata = quantile_strata(data[column], cut_off_dict, labels)
+    km = stratified_km(data, time, event, strata)
+    shown = [k for k, n in enumerate(km['n']) if n > 0]
+    empty = [km['labels'][k] for k, n in enumerate(km['n']) if n == 0]
+    if empty:
+        # Tied values can leave quantile bands empty
+        print(f"Skipping empty strata: {', '.join(empty)}")
+    if len(colours) < len(shown):
+        colours = list(colours) + [plt.cm.viridis(x) for x in np.linspace(0, 0.9, len(shown) - len(colours))]
+    legend_labels = ['{group}, n={i}'.format(group=km['labels'][k], i=km['n'][k]) for k in shown]
     
-    # Check the type of cut-off dictionary and set labels and models accordingly
-    if cut_off_dict == cut_off_quarts:
-        kmf_labels = ["1st qrt", "2nd qrt", "3rd qrt", '4th qrt']
-        kmf_firstq, kmf_secondq, kmf_thirdq, kmf_fourthq = KaplanMeierFitter(), KaplanMeierFitter(), KaplanMeierFitter(), KaplanMeierFitter()
-        models = [kmf_firstq, kmf_secondq, kmf_thirdq, kmf_fourthq]
-    elif cut_off_dict == cut_off_threequarts:
-        kmf_labels = ["1st quart", "2nd-3rd quart", "4th quart"]
-        kmf_firstq, kmf_secondq, kmf_thirdq = KaplanMeierFitter(), KaplanMeierFitter(), KaplanMeierFitter()
-        models = [kmf_firstq, kmf_secondq, kmf_thirdq]
-    elif cut_off_dict == cut_off_tertiles:
-        kmf_labels = ["1st tertile", "2nd tertile", "3rd tertile"]
-        kmf_firstq, kmf_secondq, kmf_thirdq = KaplanMeierFitter(), KaplanMeierFitter(), KaplanMeierFitter()
-        models = [kmf_firstq, kmf_secondq, kmf_thirdq]
-    elif cut_off_dict == cut_off_two_one_one:
-        kmf_labels = ["1st & 2nd quart.", "3rd quart.", '4th quart.']
-        kmf_firstq, kmf_secondq, kmf_thirdq = KaplanMeierFitter(), KaplanMeierFitter(), KaplanMeierFitter()
-        models = [kmf_firstq, kmf_secondq, kmf_thirdq]
-    else:
-        print("Cut off dictionary invalid")
-        return
+    if censor_style is None:
+        censor_style = 'bins' if large_n else 'markers'
+    if censor_style not in ('markers', 'bins', 'rug', 'none'):
+        raise ValueError(f"censor_style must be 'markers', 'bins', 'rug' or 'none', got {censor_style!r}")
+    if rasterize is None:
+        rasterize = large_n
+    censor_edges = np.linspace(xlim[0], xlim[1], censor_bins + 1)
     
     # Create the plot with specified dimensions and resolution
     plt.figure(figsize=figsize, dpi=300, facecolor=None)
+    ax = plt.gca()
     
-    # Plot Kaplan-Meier survival curves for each group using stratified data
-    for (group, group_label, kmf_model, color) in zip(stratified_data, kmf_labels, models, colours):
-        kmf_model.fit(group.loc[:,time], group.loc[:,event], label='{group}, n={i}'.format(
-            group=group_label, i=len(group)))
-        ax = kmf_model.plot(show_censors=True, ci_show=ci_show, ci_alpha = alpha, censor_styles={'ms': 0.9, 'marker': 'o'}, linewidth=0.9, color=color, fontsize=7)
+    # Draw the precomputed step functions, from S(0) = 1 to the last time of each stratum
+    for k, legend_label, color in zip(shown, legend_labels, colours):
+        observed = km['deaths'][:, k] + km['censored'][:, k] > 0
+        if large_n:
+            # S only changes at deaths: keep those vertices and the end of follow-up
+            observed = (km['deaths'][:, k] > 0) | (np.arange(len(observed)) == np.flatnonzero(observed)[-1])
+        rows = np.flatnonzero(observed)
+        start = [] if km['times'][rows[0]] == 0 else [0]
+        x = np.r_[np.zeros(len(start)), km['times'][rows]]
+        y = np.r_[np.ones(len(start)), km['survival'][rows, k]]
+        ax.step(x, y, where='post', linewidth=0.9, color=color, label=legend_label)
+        if ci_show:
+            ax.fill_between(x, np.r_[np.ones(len(start)), km['lower'][rows, k]],
+                            np.r_[np.ones(len(start)), km['upper'][rows, k]],
+                            step='post', alpha=alpha, color=color, linewidth=1.0, rasterized=rasterize)
+        if censor_style == 'markers':
+            censored = np.flatnonzero(km['censored'][:, k] > 0)
+            ax.plot(km['times'][censored], km['survival'][censored, k], linestyle='None',
+                    marker='o', ms=0.9, color=color, rasterized=rasterize)
+        elif censor_style in ('bins', 'rug'):
+            _plot_binned_censors(ax, km, k, censor_edges, censor_style, color, rasterize)
+    ax.legend()
+    ax.tick_params(labelsize=7)
     
     # Set plot limits and labels
     ax.set_xlim(xlim)
@@ -108,24 +442,79 @@ def plot_km(data, time, event, cut_off_dict={0:.25, .25:.5, .5:.75, .75:1},
     plt.xlabel("MS-free survival in years", fontsize=7)
     plt.ylabel("MS-free survival probability", fontsize=7)
     
-    # Add at-risk counts to the plot if necessary
-    if len(cut_off_dict) == 3:
-        add_at_risk_counts(models[0], models[1], models[2], fontsize=5)
-    elif len(cut_off_dict) == 4:
-        add_at_risk_counts(models[0], models[1], models[2], models[3], fontsize=5)
+    # Add at-risk counts to the plot
+    _add_at_risk_table(ax, km, shown, legend_labels, fontsize=5)
     
     # Adjust layout and save the plot as a PNG file
     plt.tight_layout()
     plt.savefig(f"{save_label}.svg")
     plt.show()
+    return km
     
     
     
+def cumulative_incidence_table(data, duration_col, event_col, strata=None, times=[5, 10, 20, 50], alpha=0.05):
+    """
+    Cumulative incidence of the event by each horizon for every stratum, for all (stratum, horizon)
+    cells at once: the curves of all strata come from one `stratified_km` pass and the horizons are
+    looked up with `searchsorted`.
+
+    Two estimates are reported: the naive proportion of each stratum with an event by t, with the
+    normal-approximation binomial CI used by `proportion_ci`, which ignores censoring; and the
+    censoring-aware 1 - Kaplan-Meier estimate (the Aalen-Johansen estimate without competing events)
+    with exponential Greenwood CIs as in lifelines.
+
+    Parameters:
+        data (pd.DataFrame): The data.
+        duration_col (str): Duration column name.
+        event_col (str): Event column name.
+        strata (str, array-like or None): Column name or per-row stratum labels (e.g. from
+            `quantile_strata`); the whole cohort is one stratum if None.
+        times (list, optional): Horizons.
+        alpha (float): 1 - confidence level.
+
+    Returns:
+        pd.DataFrame: One row per (stratum, time) with n, events, the naive proportion and CI, and the
+            KM cumulative incidence and CI.
+    """
+    times = list(times)
+    km = stratified_km(data, duration_col, event_col, strata, alpha)
+    labels = km['labels']
+    idx = _km_lookup(km, times)
+    started = (idx >= 0)[:, None]
+    survival = np.where(started, km['survival'][idx], 1.0).T
+    greenwood = np.where(started, km['greenwood'][idx], 0.0).T
+    n_events = np.where(started, km['deaths'].cumsum(0)[idx], 0.0).T
+    n = km['n'][:, None].astype(float)
+    z = stats.norm.ppf(1 - alpha / 2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportion = n_events / n
+        half_width = z * np.sqrt(proportion * (1 - proportion) / n)
+    # Bounds of S flipped for the incidence 1 - S
+    survival_lower, survival_upper = _exponential_greenwood(survival, greenwood, z)
+    km_lower, km_upper = 1 - survival_upper, 1 - survival_lower
+
+    return pd.DataFrame({
+        'stratum': np.repeat(labels, len(times)),
+        'time': np.tile(times, len(labels)),
+        'n': np.repeat(km['n'], len(times)),
+        'events': n_events.ravel().astype(int),
+        'proportion': proportion.ravel(),
+        'proportion_lower': (proportion - half_width).ravel(),
+        'proportion_upper': (proportion + half_width).ravel(),
+        'km_incidence': 1 - survival.ravel(),
+        'km_lower': km_lower.ravel(),
+        'km_upper': km_upper.ravel(),
+    })
+
+
 def proportion_ci(data,event_col , duration_col,
                   cut_off_dict={0:.25, .25:.5, .5:.75, .75:1},
                   stratify=False, timelist=[5,10,20, 50] ):
     """
     Calculates proportions and their 95% confidence intervals using the normal approximation to the binomial distribution.
+    Computed by `cumulative_incidence_table`, which also gives censoring-aware KM estimates.
     
     Args:
         data (list): A list of DataFrames containing the data to be analyzed.
@@ -136,37 +525,102 @@ def proportion_ci(data,event_col , duration_col,
         DataFrame: A DataFrame containing calculated proportions and confidence intervals for each group and time point.
     """
     
-    mean_ci_df = pd.DataFrame()  # Initialize an empty DataFrame to store results
-    
-    for y, i in enumerate(data):
-        
-        for ts, timepoint in enumerate(timelist):  # Iterate over time points
-            
-            if len(i.loc[(i[event_col] == 1) & (i[duration_col] <= timepoint)]) != 0:
-                n = i.loc[(i[event_col] == 1) & (i[duration_col] <= timepoint)][event_col].value_counts()
-            else:
-                n = 0
-                
-            p = float(n / len(i))  # Calculate the proportion
-            crit_z = 1.96  # Critical value for a 95% confidence interval
-            ci_95 = crit_z * ((p * (1 - p)) / len(i)) ** 0.5  # Calculate the confidence interval
-            
-            if y == 0:
-                # Create a dictionary for the confidence interval values
-                ci_data = {
-                    ("lower_ci" + str(timepoint)): round(p - ci_95, 3),
-                    ("proportion" + str(timepoint)): round(p, 3),
-                    ("upper_ci" + str(timepoint)): round(p + ci_95, 3)
-                }
-                
-                # Create a DataFrame for the current time point
-                ci_df = pd.DataFrame([ci_data])
-                mean_ci_df = pd.concat([mean_ci_df, ci_df], axis=1)
-            
-            elif y > 0:
-                # Update the DataFrame for additional time points
-                mean_ci_df.loc[y, ("lower_ci" + str(timepoint))] = round(p - ci_95, 3)
-                mean_ci_df.loc[y, ("proportion" + str(timepoint))] = round(p, 3)
-                mean_ci_df.loc[y, ("upper_ci" + str(timepoint))] = round(p + ci_95, 3)
+    # One frame with the group number of every row instead of a loop over the groups
+    sizes = [len(i) for i in data]
+    combined = pd.DataFrame({
+        duration_col: np.concatenate([i[duration_col].to_numpy(dtype=float) for i in data]),
+        event_col: np.concatenate([i[event_col].to_numpy(dtype=float) for i in data]),
+    })
+    groups = np.repeat(np.arange(len(data)), sizes)
+    table = cumulative_incidence_table(combined, duration_col, event_col, strata=groups, times=timelist)
+
+    mean_ci_df = pd.DataFrame(index=range(len(data)))
+    for timepoint in timelist:
+        cells = table[table['time'] == timepoint].set_index('stratum').reindex(range(len(data)))
+        mean_ci_df["lower_ci" + str(timepoint)] = cells['proportion_lower'].round(3).to_numpy()
+        mean_ci_df["proportion" + str(timepoint)] = cells['proportion'].round(3).to_numpy()
+        mean_ci_df["upper_ci" + str(timepoint)] = cells['proportion_upper'].round(3).to_numpy()
         
-    return mean_ci_df  # Return the DataFrame with calculated proportions and confidence intervals
\ No newline at end of file
+    return mean_ci_df  # Return the DataFrame with calculated proportions and confidence intervals
+
+
+def time_dependent_auc(data, time, event, column='cph_prediction', times=time_list, by=None,
+                       n_bootstrap=0, alpha=0.05, seed=0, n_jobs=1):
+    """
+    Time-dependent discrimination of the score the KM plots stratify on: the cumulative/dynamic AUC
+    with inverse-probability-of-censoring weights at every horizon, computed for all horizons in one
+    pass over the sorted scores (`evaluation.cumulative_dynamic_auc`), optionally within subgroups
+    and with percentile bootstrap CIs.
+
+    Parameters:
+        data (DataFrame): The cohort, as passed to `plot_km`.
+        time (str): Duration column name.
+        event (str): Event column name.
+        column (str): The risk score column (higher = earlier event).
+        times (list, optional): Horizons. Defaults to `utilities_mod.time_list`.
+        by (str, optional): Column defining subgroups (e.g. sex) to compute the AUC within.
+        n_bootstrap (int): Number of bootstrap replicates for the CIs; no CIs if 0.
+        alpha (float): 1 - confidence level of the CIs.
+        seed (int): Seed of the bootstrap.
+        n_jobs (int): Number of worker processes for the bootstrap (-1 for all cores).
+
+    Returns:
+        DataFrame: One row per (group, time) with the number of cases and controls, the AUC and,
+            with `n_bootstrap`, its CI bounds.
+    """
+    groups = [('all', data)] if by is None else list(data.groupby(by, observed=True))
+    tables = []
+    for group, frame in groups:
+        durations = frame[time].to_numpy(dtype=float)
+        events = frame[event].to_numpy().astype(bool)
+        risk = frame[column].to_numpy(dtype=float)
+        if n_bootstrap:
+            table, _ = cumulative_dynamic_auc_bootstrap(durations, events, risk, times, n_bootstrap=n_bootstrap,
+                                                        alpha=alpha, seed=seed, n_jobs=n_jobs)
+        else:
+            table = cumulative_dynamic_auc(durations, events, risk, times).reset_index()
+        horizons = np.asarray(times, dtype=float)[:, None]
+        table.insert(0, 'group', group)
+        table.insert(2, 'cases', (events & (durations <= horizons)).sum(1))
+        table.insert(3, 'controls', (durations > horizons).sum(1))
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def plot_time_dependent_auc(auc_table, save_label='Unnamed', plot_label='', figsize=[3, 3], colours=colours,
+                            ylim=[0.5, 1]):
+    """
+    Plots the time-dependent AUC of `time_dependent_auc` against the horizon, one line per group,
+    with the bootstrap CIs as error bars when present.
+
+    Args:
+        auc_table (DataFrame): Output of `time_dependent_auc`.
+        save_label (str): A label for saving the plot.
+        plot_label (str): A label for the plot title.
+        figsize (list): A list specifying the dimensions of the plot.
+        colours (list): A list of colors for different groups.
+        ylim (list): Limits of the AUC axis.
+
+    Returns:
+        None
+    """
+    plt.figure(figsize=figsize, dpi=300, facecolor=None)
+    ax = plt.gca()
+    for (group, table), color in zip(auc_table.groupby('group', sort=False), colours):
+        if 'auc_lower' in table:
+            error = [table['auc'] - table['auc_lower'], table['auc_upper'] - table['auc']]
+        else:
+            error = None
+        ax.errorbar(table['time'], table['auc'], yerr=error, marker='o', ms=2, linewidth=0.9, capsize=2,
+                    color=color, label=str(group))
+    ax.axhline(0.5, color='grey', linewidth=0.5, linestyle='--')
+    ax.set_ylim(ylim)
+    ax.tick_params(labelsize=7)
+    if auc_table['group'].nunique() > 1:
+        ax.legend(fontsize=6)
+    plt.title(plot_label, fontsize=7)
+    plt.xlabel("Horizon in years", fontsize=7)
+    plt.ylabel("Time-dependent AUC", fontsize=7)
+    plt.tight_layout()
+    plt.savefig(f"{save_label}_AUC.svg")
+    plt.show()